@@ -22,12 +22,15 @@
 
 ###### Standard library imports ######
 # don't confuse the 'date' method with the 'Date' variable!
+import os
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
 from datetime import date
-from math import degrees, pi, tan
-import sys
+from math import acos, cos, degrees, pi, sin, tan
 
 ###### Third party imports ######
 import ephem
+import numpy as np
 
 ###### Local application imports ######
 import config
@@ -38,6 +41,8 @@ ephem_venus   = ephem.Venus()
 ephem_mars    = ephem.Mars()
 ephem_jupiter = ephem.Jupiter()
 ephem_saturn  = ephem.Saturn()
+ephem_bodies  = {'sun': ephem_sun, 'moon': ephem_moon, 'venus': ephem_venus,
+                 'mars': ephem_mars, 'jupiter': ephem_jupiter, 'saturn': ephem_saturn}
 #degree_sign= u'\N{DEGREE SIGN}'
 
 #----------------------
@@ -125,83 +130,354 @@ def flag_msg(msg):
         print(msg)
     return
 
+#--------------------
+#   LaTeX symbols
+#--------------------
+
+# The table cells show a sun/moon continually above or below the horizon and 'no moonrise
+# (moonset) today' as \UP, \DN and \DOTS, which are defined once in the preamble
+# (makeNAnew/makeNAold in nautical.py, makeEVnew/makeEVold in eventtables.py).
+# TikZ draws the open rectangle only once into a save box that every \UP reuses.
+symbolmacros = r'''
+\newsavebox{\UPbox}
+\AtBeginDocument{\sbox{\UPbox}{\begin{tikzpicture}\draw (0,0) rectangle (12pt,4pt);\end{tikzpicture}}}
+\newcommand{\UP}{\usebox{\UPbox}}
+\newcommand{\DN}{\rule{12Pt}{4Pt}}
+\newcommand{\DOTS}{\raisebox{0.24ex}{\boldmath$\cdot\cdot$~\boldmath$\cdot\cdot$}}'''
+
+#------------------------------
+#   ephemeris state cache
+#------------------------------
+
+# Computed body states are kept in a process-wide cache keyed by (body, ephem date)
+# so that the same body is never computed twice for the same instant, e.g. the
+# hour following midnight for v and d, or midnight for SHA and Mer.pass.
+# The least recently used entry is discarded when 'cachesize' is exceeded.
+
+BodyState = namedtuple('BodyState', 'g_ra g_dec radius earth_distance mag phase elong')
+cachesize = 16384
+statecache = OrderedDict()
+
+def bodystate(name, Date):
+    # returns the BodyState of body 'name' (a key in ephem_bodies) at 'Date'
+    key = (name, float(Date))
+    st = statecache.get(key)
+    if st is not None:
+        statecache.move_to_end(key)
+        return st
+    st = stored(key, Date)
+    if st is None:
+        body = ephem_bodies[name]
+        body.compute(Date)
+        st = BodyState(body.g_ra+0.0, body.g_dec+0.0, body.radius+0.0,
+                       getattr(body, 'earth_distance', None), body.mag,
+                       getattr(body, 'phase', None), body.elong+0.0)
+    statecache[key] = st
+    if len(statecache) > cachesize:
+        statecache.popitem(last=False)
+    return st
+
+def sidereal(Date):
+    # returns the Greenwich apparent sidereal time (radians) at 'Date'
+    key = ('aries', float(Date))
+    st = statecache.get(key)
+    if st is not None:
+        statecache.move_to_end(key)
+        return st
+    st = stored(key, Date)
+    if st is None:
+        obs = ephem.Observer()
+        obs.date = Date
+        st = obs.sidereal_time()+0.0
+    statecache[key] = st
+    if len(statecache) > cachesize:
+        statecache.popitem(last=False)
+    return st
+
+#-------------------------------------
+#   persistent ephemeris store
+#-------------------------------------
+
+# With config.ephemstore the body states, sidereal times and rise/set search results
+# of a year can be saved (see 'pyalmanac.py --warm-cache YEAR') as NumPy arrays in
+# config.storedir/YEAR and are then memory-mapped by later runs: a result missing
+# from the state cache (or 'risecache') is looked up in the store of its year (or
+# the year before, which also holds the first days of the following year) before it
+# is computed, and a stored result is then kept in the cache like a computed one.
+# The rows of each table are sorted by date and a separate (sorted) array of the
+# dates is searched with np.searchsorted, so a lookup only reads the rows of one date.
+# Stored values are the exact floating point results, so the tables are unchanged.
+# A store written with another version of Ephem is ignored.
+
+storeyears = {}     # stored tables per year (None if there is no store)
+storetables = {'bodies': 1, 'aries': 0, 'risesets': 2}   # table: column of the date
+
+def storepath(year):
+    return os.path.join(config.docker_prefix + config.storedir, str(year))
+
+def loadstore(year):
+    # returns the memory-mapped tables stored for 'year' as {table: (dates, rows)}
+    # and the body codes as {'names': {name: code}} (None if there is no store)
+    folder = storepath(year)
+    try:
+        with open(os.path.join(folder, "version.txt")) as f:
+            if f.read() != ephem.__version__:
+                return None
+        names = np.load(os.path.join(folder, "names.npy"))
+        store = {'names': {str(name): float(i) for i, name in enumerate(names)}}
+        for table in storetables:
+            store[table] = (np.load(os.path.join(folder, table + "-dates.npy"), mmap_mode='r'),
+                            np.load(os.path.join(folder, table + ".npy"), mmap_mode='r'))
+    except (OSError, ValueError):
+        return None
+    return store
+
+def lookup(store, key):
+    # returns the result stored for 'key' (a statecache key) in 'store' or None
+    if key[0] == 'aries':
+        table, date, match = 'aries', key[1], []
+    else:
+        code = store['names'].get(key[0])
+        if code is None:
+            return None
+        if len(key) == 2:
+            table, date, match = 'bodies', key[1], [(0, code)]
+        elif len(key) == 6:
+            table, date = 'risesets', key[2]
+            match = [(0, code), (1, key[1]), (3, key[3]), (4, float(key[4])), (5, float(key[5]))]
+        else:
+            return None
+    dates, rows = store[table]
+    lo = np.searchsorted(dates, date, 'left')
+    hi = np.searchsorted(dates, date, 'right')
+    if lo == hi:
+        return None
+    block = np.asarray(rows[lo:hi])
+    found = np.ones(hi - lo, dtype=bool)
+    for col, value in match:
+        found &= block[:,col] == value
+    found = np.flatnonzero(found)
+    if len(found) == 0:
+        return None
+    row = block[found[0]].tolist()
+    if table == 'aries':
+        return row[1]
+    if table == 'bodies':
+        return BodyState(*[None if x != x else x for x in row[2:]])
+    return RiseSet(None if row[6] != row[6] else ephem.date(row[6]), int(row[7]))
+
+def stored(key, Date):
+    # returns the stored result for 'key' (a statecache key) or None
+    if not config.ephemstore:
+        return None
+    year = ephem.date(Date).triple()[0]
+    for yr in [year, year-1]:
+        if yr not in storeyears:
+            storeyears[yr] = loadstore(yr)
+        if storeyears[yr] is not None:
+            res = lookup(storeyears[yr], key)
+            if res is not None:
+                return res
+    return None
+
+def savestore(year):
+    # saves the body states and sidereal times in the state cache and the rise/set
+    # results in 'risecache' as the store for 'year'
+    names = sorted(set(ephem_bodies) | set(topo_bodies))
+    code = {name: float(i) for i, name in enumerate(names)}
+    nan = float('nan')
+    bodies = []
+    aries = []
+    risesets = []
+    for key, st in list(statecache.items()) + list(risecache.items()):
+        if key[0] == 'aries':
+            aries.append([key[1], st])
+        elif len(key) == 2:
+            bodies.append([code[key[0]], key[1]] + [nan if x is None else x for x in st])
+        elif len(key) == 6:
+            date = nan if st.date is None else float(st.date)
+            risesets.append([code[key[0]], key[1], key[2], key[3], float(key[4]), float(key[5]), date, float(st.state)])
+    folder = storepath(year)
+    os.makedirs(folder, exist_ok=True)
+    np.save(os.path.join(folder, "names.npy"), np.array(names))
+    for table, rows, width in [('bodies', bodies, 9), ('aries', aries, 2), ('risesets', risesets, 8)]:
+        rows = np.array(rows, dtype=float).reshape(-1, width)
+        col = storetables[table]
+        rows = rows[np.argsort(rows[:,col], kind='stable')]     # sorted by date
+        np.save(os.path.join(folder, table + ".npy"), rows)
+        np.save(os.path.join(folder, table + "-dates.npy"), np.ascontiguousarray(rows[:,col]))
+    with open(os.path.join(folder, "version.txt"), "w") as f:
+        f.write(ephem.__version__)
+    storeyears.pop(year, None)
+    return
+
+#--------------------------------------------
+#   Chebyshev ephemeris representation
+#--------------------------------------------
+
+# Optionally (config.chebyshev) the hourly grid is evaluated from Chebyshev series
+# fitted by least squares to 2*('chebdeg'+1) PyEphem samples per body and page
+# instead of computing every hour. The largest residual at the samples is checked
+# for each body and page: above 'chebbound' arc minutes (RA or Dec) the body is
+# computed directly for that page. This is needed because PyEphem's positions are
+# not always smooth; e.g. Venus near its conjunction with the Sun on 2024-06-02
+# deviates by 0.019' from any fit (and a higher degree does not help). Elsewhere
+# the fits agree to about 0.0006' (Jupiter) or better, so a printed value (0.1'
+# precision) can still differ from the direct computation when it lies within
+# 'chebbound' of a rounding boundary. For this reason 'config.chebyshev' is off
+# by default.
+
+chebdeg = 10
+chebbound = 0.001
+
+def chebfit(name, t0, t1, deg = chebdeg):
+    # returns Chebyshev coefficients for RA, Dec, radius and magnitude of body 'name'
+    # over the interval t0..t1 (ephem dates), fitted to twice as many Chebyshev nodes;
+    # 'err' is the largest residual of RA or Dec at the nodes (arc minutes)
+    m = 2*(deg+1)
+    x = np.cos(pi*(np.arange(m)+0.5)/m)
+    samples = np.empty((4, m))
+    for k in range(m):
+        st = bodystate(name, (t0+t1)/2 + (t1-t0)/2*x[k])
+        samples[:,k] = st.g_ra, st.g_dec, st.radius, st.mag
+    samples[0] = np.unwrap(samples[0])     # RA is continuous across 0h
+    coef = np.polynomial.chebyshev.chebfit(x, samples.T, deg)
+    resid = np.polynomial.chebyshev.chebval(x, coef[:,:2]) - samples[:2]
+    return {'t0': t0, 't1': t1, 'coef': coef, 'err': np.abs(resid).max()*180*60/pi}
+
+def chebeval(fit, dates):
+    # evaluates a Chebyshev fit at the given ephem dates; returns ra, dec, rad, mag arrays
+    t0 = fit['t0']
+    t1 = fit['t1']
+    x = (2*np.asarray(dates) - (t0+t1))/(t1-t0)
+    ra, dec, rad, mag = np.polynomial.chebyshev.chebval(x, fit['coef'])
+    # PyEphem magnitudes are given to 0.01
+    return np.mod(ra, 2*pi), dec, rad, np.round(mag, 2)
+
+#----------------------------
+#   hourly ephemeris grid
+#----------------------------
+
+gridbodies = ['sun','moon','venus','mars','jupiter','saturn']
+
+def hourgrid(Date, hours, bodies=gridbodies):
+    # returns the ephemerides on an hourly grid beginning at 'Date' as NumPy arrays.
+    # The grid has hours+1 entries: the extra hour provides v and d for the last hour.
+    #   grid['date']            ephem date (float) of each grid hour
+    #   grid['aries']['gha']    GHA of Aries (radians)
+    #   grid[body]['gha'/'dec'] GHA and Declination (radians) of each body in 'bodies'
+    #   grid[body]['v'/'d']     v and d (arc minutes) from each hour to the next
+    #   grid[body]['sd']        semi-diameter (arc minutes)
+    #   grid[body]['hp']        horizontal parallax (arc minutes) - Moon only
+    #   grid[body]['mag']       magnitude
+
+    n = hours + 1
+    dates = np.empty(n)
+    for i in range(n):
+        if i%24 == 0:
+            dates[i] = Date + i//24     # each day starts exactly at midnight
+        else:
+            dates[i] = dates[i-1] + ephem.hour
+    sidt = np.empty(n)
+    for i in range(n):
+        sidt[i] = sidereal(dates[i])
+    grid = {'date': dates, 'aries': {'gha': np.mod(sidt, 2*pi)}}
+
+    for name in bodies:
+        fit = None
+        if config.chebyshev and n > 2*(chebdeg + 1):
+            fit = chebfit(name, dates[0], dates[-1])
+            if fit['err'] > chebbound:
+                fit = None      # not smooth enough: compute directly (see above)
+        if fit is not None:
+            ra, dec, rad, mag = chebeval(fit, dates)
+        else:
+            ra  = np.empty(n)
+            dec = np.empty(n)
+            rad = np.empty(n)
+            mag = np.empty(n)
+            for i in range(n):
+                st = bodystate(name, dates[i])
+                ra[i]  = st.g_ra
+                dec[i] = st.g_dec
+                rad[i] = st.radius
+                mag[i] = st.mag
+        gha = np.mod(sidt - ra, 2*pi)
+        # the nominal hourly increase of GHA is 14°19' for the Moon and 15° otherwise
+        if name == 'moon':
+            rate = ephem.degrees('14:19:00')
+        else:
+            rate = ephem.degrees('15:00:00')
+        eph = {'gha': gha, 'dec': dec, 'mag': mag}
+        eph['v']  = (np.mod(gha[1:] - gha[:-1], 2*pi) - rate)*360*30/pi
+        eph['d']  = (dec[1:] - dec[:-1])*360*30/pi
+        eph['sd'] = rad*360*30/pi
+        if name == 'moon':
+            eph['hp'] = (rad/0.272805950305)*360*30/pi
+        grid[name] = eph
+    return grid
+
+def sunmoon_at(grid, i):    # used in sunmoontab(m)
+    # returns sun and moon ephemerides for grid hour 'i' (as sunmoon does)
+    sun  = grid['sun']
+    moon = grid['moon']
+    ghas = nadeg(sun['gha'][i])
+    decs = nadeg(sun['dec'][i],2)
+    gham = nadeg(moon['gha'][i])
+    decm = nadeg(moon['dec'][i],2)
+    vm = "{:0.1f}'".format(moon['v'][i])
+    dm = "{:0.1f}'".format(moon['d'][i])
+    hp = "{:0.1f}'".format(moon['hp'][i])
+    return ghas,decs,gham,vm,decm,dm,hp,sun['dec'][i],moon['dec'][i]
+
+def sun_moon_SD_at(grid, i):    # used in sunmoontab(m)
+    # returns the sun's d, the sun's and moon's semi-diameter for grid hour 'i'
+    ds  = "{:0.1f}".format(grid['sun']['d'][i])
+    sds = "{:0.1f}".format(grid['sun']['sd'][i])
+    sdm = "{:0.1f}".format(grid['moon']['sd'][i])
+    return ds,sds,sdm
+
+def planetsGHA_at(grid, i):     # used in planetstab(m)
+    # returns Aries and planet ephemerides for grid hour 'i' (as planetsGHA does)
+    out = [nadeg(grid['aries']['gha'][i])]
+    for name in ['venus','mars','jupiter','saturn']:
+        out.append(nadeg(grid[name]['gha'][i]))
+        out.append(nadeg(grid[name]['dec'][i],2))
+    for name in ['venus','mars','jupiter','saturn']:
+        out.append(grid[name]['dec'][i])
+    return tuple(out)
+
+def vdm_planets_at(grid, i):    # used in planetstab(m)
+    # returns v, d and magnitude of the planets for grid hour 'i' (as vdm_planets does)
+    # note: the magnitude is taken at the end of the hour (as always printed)
+    out = []
+    for name in ['venus','mars','jupiter','saturn']:
+        out.append("{:0.1f}".format(grid[name]['v'][i]))
+        out.append("{:0.1f}".format(grid[name]['d'][i]))
+        out.append("{:0.1f}".format(grid[name]['mag'][i+1]))
+    return tuple(out)
+
 #-------------------------------
 #   Sun and Moon calculations
 #-------------------------------
 
-def sunmoon(Date):          # used in suntab(m), sunmoontab(m)
+def sunmoon(Date):
     # returns ephemrerids for sun and moon.
     
     #Sun        gha dec
     #Moon       gha v dec d hp
 
-    obs = ephem.Observer()
-    obs.date = Date
-    
-    #Sun
-    ephem_sun.compute(Date,epoch=Date)
-    deg = ephem.degrees(obs.sidereal_time()-ephem_sun.g_ra).norm
-    ghas = nadeg(deg)
-    degs = ephem_sun.g_dec
-    decs = nadeg(degs,2)
-    
-    #Moon
-    ephem_moon.compute(Date,epoch=Date)
-    deg = ephem.degrees(obs.sidereal_time()-ephem_moon.g_ra).norm
-    gham = nadeg(deg)
-    degm = ephem_moon.g_dec
-    decm = nadeg(degm,2)
-    
-    #calculate the moon's horizontal paralax
-    deg = ephem.degrees(ephem_moon.radius/0.272805950305)
-    hp = "{:0.1f}'".format(deg*360*30/pi)
-    
-    #calculate v and d by advancing the time with one hour.
-    ephem_moon.compute(Date,epoch=Date)
-    obs.date = Date
-    rgha = ephem.degrees(obs.sidereal_time()-ephem_moon.g_ra).norm
-    rdec = ephem_moon.g_dec
-    ephem_moon.compute(Date+ephem.hour,epoch=Date+ephem.hour)
-    obs.date = Date + ephem.hour
-    rghap = ephem.degrees(obs.sidereal_time()-ephem_moon.g_ra).norm
-
-    deg = ephem.degrees(ephem.degrees(rghap-rgha).norm-ephem.degrees('14:19:00'))
-    vmf = deg*360*30/pi
-    vm = "{:0.1f}'".format(vmf)
-
-    deg = ephem.degrees(ephem_moon.g_dec-rdec)
-    dmf = deg*360*30/pi
-    dm = "{:0.1f}'".format(dmf)
-    
-    # degs, degm have been added for the sunmooontab function
-    return ghas,decs,gham,vm,decm,dm,hp,degs,degm
+    return sunmoon_at(hourgrid(Date, 1, ['sun','moon']), 0)
 
-def sun_moon_SD(Date):      # used in suntab(m), sunmoontab(m)
-    obs = ephem.Observer()
-    obs.date = Date
-    
-    #Sun
-    # compute semi-diameter of sun and sun's declination change per hour (in minutes)
-    ephem_sun.compute(Date)
-    dec = ephem_sun.g_dec
-    ephem_sun.compute(Date+ephem.hour)
-    obs.date = Date+ephem.hour
-    deg = ephem.degrees(ephem_sun.g_dec-dec)
-    ds = "{:0.1f}".format(deg*360*30/pi)
-    sds = "{:0.1f}".format(ephem_sun.radius*360*30/pi)
-    
-    #Moon
-    # compute semi-diameter of moon (in minutes)
-    ephem_moon.compute(Date)
-    sdm = "{:0.1f}".format(ephem_moon.radius*360*30/pi)
-    
-    return ds,sds,sdm
+def sun_moon_SD(Date):
+    # compute semi-diameter of sun and moon and the sun's declination change per hour (in minutes)
+    return sun_moon_SD_at(hourgrid(Date, 1, ['sun','moon']), 0)
 
 #------------------------------------------------
 #   Venus, Mars, Jupiter & Saturn calculations
 #------------------------------------------------
 
-def planetsGHA(Date):       # used in planetstab(m)
+def planetsGHA(Date):
     # this function returns a tuple of strings with ephemerids in the format used by the nautical almanac.
     
     # following are objects and their values:
@@ -211,166 +487,129 @@ def planetsGHA(Date):       # used in planetstab(m)
     #Jupiter    gha dec
     #Saturn     gha dec
 
-    obs = ephem.Observer()
-    obs.date = Date
-    
-    #Aries, First Point of
-    deg = ephem.degrees(obs.sidereal_time()).norm
-    ghaa = nadeg(deg)
-    
-    #Venus
-    ephem_venus.compute(Date,epoch=Date)
-    deg = ephem.degrees(obs.sidereal_time()-ephem_venus.g_ra).norm
-    ghav = nadeg(deg)
-    degv = ephem_venus.g_dec
-    decv = nadeg(degv,2)
-    
-    #Mars
-    ephem_mars.compute(Date,epoch=Date)
-    deg = ephem.degrees(obs.sidereal_time()-ephem_mars.g_ra).norm
-    ghamars = nadeg(deg)
-    degmars = ephem_mars.g_dec
-    decmars = nadeg(degmars,2)
-    
-    #Jupiter
-    ephem_jupiter.compute(Date,epoch=Date)
-    deg = ephem.degrees(obs.sidereal_time()-ephem_jupiter.g_ra).norm
-    ghaj = nadeg(deg)
-    degj = ephem_jupiter.g_dec
-    decj = nadeg(degj,2)
-    
-    #Saturn
-    ephem_saturn.compute(Date,epoch=Date)
-    deg = ephem.degrees(obs.sidereal_time()-ephem_saturn.g_ra).norm
-    ghasat = nadeg(deg)
-    degsat = ephem_saturn.g_dec
-    decsat = nadeg(degsat,2)
-
     # degv, degmars, degj, degsat have been added for the planetstab function
-    return ghaa,ghav,decv,ghamars,decmars,ghaj,decj,ghasat,decsat,degv,degmars,degj,degsat
+    return planetsGHA_at(hourgrid(Date, 0, ['venus','mars','jupiter','saturn']), 0)
 
-def vdm_planets(Date):      # used in planetstab(m)
+def vdm_planets(Date):
     # compute v (GHA correction), d (Declination correction), m (magnitude of planet)
+    return vdm_planets_at(hourgrid(Date, 1, ['venus','mars','jupiter','saturn']), 0)
+
+#----------------------
+#   transit engine
+#----------------------
 
+# A meridian passage is where the hourly GHA of a body (see hourgrid) crosses 0°
+# (180° for the lower meridian passage). The crossing is interpolated with the
+# cubic through the four surrounding hours, which agrees with PyEphem's transit
+# search to about 0.1 ms; 'refine' adds one Newton step on the GHA computed at the
+# interpolated instant for results that are rounded to the second. Passages that
+# are not bracketed by the grid (or if no grid is given) are searched with PyEphem.
+
+def transit(grid, name, start, offset = 0.0, refine = False):
+    # returns the first meridian passage (offset = 0) or lower meridian passage
+    # (offset = pi) of body 'name' after 'start' as an ephem date
+    if grid is not None and grid['date'][0] <= start:
+        dates = grid['date']
+        gha = np.unwrap(grid[name]['gha'])
+        n = len(dates)
+        passes = np.floor((gha - offset)/(2*pi))
+        k = max(int(np.searchsorted(dates, start, side='right')) - 1, 0)
+        while n >= 4 and k < n-1:
+            if passes[k+1] > passes[k]:
+                j = min(max(k-1, 0), n-4)
+                c = np.polyfit(np.arange(4) + j - k, gha[j:j+4] - offset - 2*pi*passes[k+1], 3)
+                dc = np.polyder(c)
+                u = np.polyval(c, 0)/(np.polyval(c, 0) - np.polyval(c, 1))
+                for i in range(4):
+                    u -= np.polyval(c, u)/np.polyval(dc, u)
+                t = dates[k] + u*(dates[k+1]-dates[k])
+                if t > start:
+                    if refine:
+                        st = bodystate(name, t)
+                        dgha = (sidereal(t) - st.g_ra - offset + pi)%(2*pi) - pi
+                        t -= dgha/np.polyval(dc, u)*(dates[k+1]-dates[k])
+                    return ephem.date(t)
+            k += 1
     obs = ephem.Observer()
-    obs.date = Date
-    
-    #Venus
-    obs.date = Date
-    ephem_venus.compute(Date)
-    gha = ephem.degrees(obs.sidereal_time()-ephem_venus.g_ra).norm
-    dec = ephem_venus.g_dec
-    ephem_venus.compute(Date+ephem.hour)
-    obs.date = Date+ephem.hour
-    ghap = ephem.degrees(obs.sidereal_time()-ephem_venus.g_ra).norm
-    deg = ephem.degrees(ghap-gha).norm-ephem.degrees('15:00:00')
-    vvenus = "{:0.1f}".format(deg*360*30/pi)
-    deg = ephem.degrees(ephem_venus.g_dec-dec)
-    dvenus = "{:0.1f}".format(deg*360*30/pi)
-    mvenus = "{:0.1f}".format(ephem_venus.mag)
-    
-    #Mars
-    obs.date = Date
-    ephem_mars.compute(Date)
-    gha = ephem.degrees(obs.sidereal_time()-ephem_mars.g_ra).norm
-    dec = ephem_mars.g_dec
-    ephem_mars.compute(Date+ephem.hour)
-    obs.date = Date+ephem.hour
-    ghap = ephem.degrees(obs.sidereal_time()-ephem_mars.g_ra).norm
-    deg = ephem.degrees(ephem.degrees(ghap-gha).norm-ephem.degrees('15:00:00'))
-    vmars = "{:0.1f}".format(deg*360*30/pi)
-    deg = ephem.degrees(ephem_mars.g_dec-dec)
-    dmars = "{:0.1f}".format(deg*360*30/pi)
-    mmars = "{:0.1f}".format(ephem_mars.mag)
-    
-    #Jupiter
-    obs.date = Date
-    ephem_jupiter.compute(Date)
-    gha = ephem.degrees(obs.sidereal_time()-ephem_jupiter.g_ra).norm
-    dec = ephem_jupiter.g_dec
-    ephem_jupiter.compute(Date+ephem.hour)
-    obs.date = Date+ephem.hour
-    ghap = ephem.degrees(obs.sidereal_time()-ephem_jupiter.g_ra).norm
-    deg = ephem.degrees(ephem.degrees(ghap-gha).norm-ephem.degrees('15:00:00'))
-    vjup = "{:0.1f}".format(deg*360*30/pi)
-    deg = ephem.degrees(ephem_jupiter.g_dec-dec)
-    djup = "{:0.1f}".format(deg*360*30/pi)
-    mjup = "{:0.1f}".format(ephem_jupiter.mag)
-    
-    #Saturn
-    obs.date = Date
-    ephem_saturn.compute(Date)
-    gha = ephem.degrees(obs.sidereal_time()-ephem_saturn.g_ra).norm
-    dec = ephem_saturn.g_dec
-    ephem_saturn.compute(Date+ephem.hour)
-    obs.date = Date+ephem.hour
-    ghap = ephem.degrees(obs.sidereal_time()-ephem_saturn.g_ra).norm
-    deg = ephem.degrees(ephem.degrees(ghap-gha).norm-ephem.degrees('15:00:00'))
-    vsat = "{:0.1f}".format(deg*360*30/pi)
-    deg = ephem.degrees(ephem_saturn.g_dec-dec)
-    dsat = "{:0.1f}".format(deg*360*30/pi)
-    msat = "{:0.1f}".format(ephem_saturn.mag)
-    
-    return vvenus,dvenus,mvenus,vmars,dmars,mmars,vjup,djup,mjup,vsat,dsat,msat
+    obs.date = start
+    if offset == 0.0:
+        return obs.next_transit(ephem_bodies[name])
+    return obs.next_antitransit(ephem_bodies[name])
 
 #-----------------------------------------
 #   Aries & planet transit calculations
 #-----------------------------------------
 
-def ariestransit(Date):     # used in planetstab(m)
-    # returns transit time of aries for given date
+def ariesdata(Date):
+    # returns the transit time of Aries for given date (as an angle in radians)
 
-    obs = ephem.Observer()
-    obs.date = ephem.date(Date)+1
-    sid = obs.sidereal_time()
-    trans = ephem.hours(2*pi-sid/1.00273790935)
+    sid = sidereal(ephem.date(Date)+1)
+    return 2*pi-sid/1.00273790935
+
+def formataries(trans):
+    # returns the transit time of Aries formatted hh:mm
+    trans = ephem.hours(trans)
 #    obs.date = Date + trans/(2*pi) #turns ephem.angle (time) into ephem date
     hhmm = str(trans)[0:5]	# can return "h:mm:"
     if hhmm[1:2] == ':':	# check if single digit hours
         hhmm = '0' + hhmm[0:4]
     return hhmm
-    
-def planetstransit(Date, round2seconds = False):   # used in starstab
-    #returns SHA and meridian passage for the navigational planets
 
-    obs = ephem.Observer()
-    
-    obs.date = Date
-    ephem_venus.compute(Date)
-    vsha = nadeg(2*pi - ephem.degrees(ephem_venus.g_ra).norm)
-    vtrans = date2time(obs.next_transit(ephem_venus), round2seconds)
-    hpvenus = "{:0.1f}".format((tan(6371/(ephem_venus.earth_distance*149597870.7)))*60*180/pi)
-    
-    obs.date = Date
-    ephem_mars.compute(Date)
-    marssha = nadeg(2*pi - ephem.degrees(ephem_mars.g_ra).norm)
-    marstrans = date2time(obs.next_transit(ephem_mars), round2seconds)
-    hpmars = "{:0.1f}".format((tan(6371/(ephem_mars.earth_distance*149597870.7)))*60*180/pi)
-
-    obs.date = Date
-    ephem_jupiter.compute(Date)
-    jsha = nadeg(2*pi - ephem.degrees(ephem_jupiter.g_ra).norm)
-    jtrans = date2time(obs.next_transit(ephem_jupiter), round2seconds)
-    
-    obs.date = Date
-    ephem_saturn.compute(Date)
-    satsha = nadeg(2*pi - ephem.degrees(ephem_saturn.g_ra).norm)
-    sattrans = date2time(obs.next_transit(ephem_saturn), round2seconds)
-    
-    return [vsha,vtrans,marssha,marstrans,jsha,jtrans,satsha,sattrans,hpmars,hpvenus]
+def ariestransit(Date):     # used in planetstab(m)
+    # returns transit time of aries for given date
+    return formataries(ariesdata(Date))
+
+def planetsdata(Date, round2seconds = False, grid = None):
+    # returns SHA (radians) and meridian passage (ephem date) of the navigational planets
+    # and the horizontal parallax (arc minutes) of Mars and Venus at meridian passage
+    # (from the hourly 'grid' of the planets if it covers 'Date')
+
+    sha = []
+    mpass = []
+    for name in ['venus','mars','jupiter','saturn']:
+        sha.append(2*pi - ephem.degrees(bodystate(name, Date).g_ra).norm)
+        mpass.append(transit(grid, name, Date, 0.0, round2seconds))
+    # horizontal parallax at meridian passage
+    hp = []
+    for t, name in [(mpass[1], 'mars'), (mpass[0], 'venus')]:
+        hp.append((tan(6371/(bodystate(name, t).earth_distance*149597870.7)))*60*180/pi)
+    return sha, mpass, hp
+
+def formatplanets(sha, mpass, hp, round2seconds = False):
+    # returns SHA and Mer.pass of Venus, Mars, Jupiter and Saturn followed by
+    # the horizontal parallax of Mars and Venus as strings (see planetsdata)
+    out = []
+    for i in range(4):
+        out.append(nadeg(sha[i]))
+        out.append(date2time(mpass[i], round2seconds))
+    for x in hp:
+        out.append("{:0.1f}".format(x))
+    return out
+
+def planetstransit(Date, round2seconds = False, grid = None):   # used in starstab
+    #returns SHA and meridian passage for the navigational planets
+    return formatplanets(*planetsdata(Date, round2seconds, grid), round2seconds)
 
 #-----------------------
 #   star calculations
 #-----------------------
 
+def starpositions(dates):
+    # returns SHA and Dec (radians) of all navigational stars for the given ephem dates
+    # as two arrays indexed [star, date] in the order of 'navstars'
+    ra  = np.empty((len(navstars), len(dates)))
+    dec = np.empty((len(navstars), len(dates)))
+    for k, name in enumerate(navstars):
+        for j, Date in enumerate(dates):
+            st = bodystate(name, Date)
+            ra[k,j]  = st.g_ra
+            dec[k,j] = st.g_dec
+    return 2*pi - np.mod(ra, 2*pi), dec
+
 def stellar(Date):          # used in starstab
     # returns a list of lists with name, SHA and Dec for all navigational stars for epoch of date.
-    out = []
-    for line in db.strip().split('\n'):
-        st = ephem.readdb(line)
-        st.compute(Date)    # calculate at midnight
-        out.append([st.name,nadeg(2*pi - ephem.degrees(st.g_ra).norm),nadeg(st.g_dec)])
-    return out
+    sha, dec = starpositions([Date])    # calculate at midnight
+    return [[navstars[k],nadeg(sha[k,0]),nadeg(dec[k,0])] for k in range(len(navstars))]
 
 # List of navigational stars with data from Hipparcos, e.g.:
 # http://vizier.u-strasbg.fr/viz-bin/VizieR-5?-source=I/311&-out.all&-out.max=10&HIP==677
@@ -439,6 +678,134 @@ Scheat,f|S|M2,23:03:46.46|187.65,28:04:58.03|136.93,2.49,2000,0
 Markab,f|S|B9,23:04:45.65|60.40,15:12:18.96|-41.30,2.48,2000,0
 """
 
+# The star catalogue is parsed once: the navigational stars share the ephemeris
+# state cache with the sun, moon and planets.
+navstars = []
+for line in db.strip().split('\n'):
+    st = ephem.readdb(line)
+    ephem_bodies[st.name] = st
+    navstars.append(st.name)
+
+#----------------------------
+#   rise/set searches
+#----------------------------
+
+# Rise/set searches repeat exactly the iteration of PyEphem's Observer.next_rising(),
+# next_setting(), previous_rising() and previous_setting() (as in PyEphem 4.2 and
+# 4.2.1, see 'riset_versions'; other versions use these public methods), so
+# event times are identical to the library's. Two caches avoid repeated work:
+#  - 'topocache', a small LRU cache of the topocentric state (dec, ha, radius) of the
+#    Sun or Moon per latitude and date: searches starting from the same instant (e.g.
+#    rising and setting from midnight, or the second event of a day starting from
+#    the first) follow each other, so 'toposize' entries suffice to share it, and
+#  - 'risecache', an LRU cache of the result of every search per body, latitude,
+#    horizon, direction and start, so the moon state and the 'no moonrise/moonset'
+#    look-ups that re-run a search just done for the same day are answered without
+#    searching again.
+# Neither is kept in 'statecache': there are far more of them than body states, and
+# they are only reused right away ('risesize' entries keep every reuse of the tables).
+# Note: the printed times depend (in the last 0.1 second) on where a search starts,
+# so every event is still searched from its own start; there is no year-long index.
+# A search never raises: it returns a RiseSet with the event 'date' (None if there
+# is no event) and its 'state': 0 = event found, +1 = the body is continually above
+# and -1 = continually below the horizon.
+
+RiseSet = namedtuple('RiseSet', 'date state')
+riset_versions = ['4.2', '4.2.1']     # PyEphem versions with the replicated search
+riset_replica = ephem.__version__ in riset_versions
+topo_bodies = {'sun': ephem.Sun(), 'moon': ephem.Moon()}
+topo_obs = ephem.Observer()
+topo_obs.pressure = 0
+toposize = 32
+topocache = OrderedDict()
+risesize = 256
+risecache = OrderedDict()
+
+def topostate(name, lat, Date):
+    # returns (dec, ha, radius) of the Sun or Moon for an observer at 'lat' (radians) at 'Date'
+    key = (name, lat, Date)
+    st = topocache.get(key)
+    if st is not None:
+        topocache.move_to_end(key)
+        return st
+    topo_obs.lat = lat
+    topo_obs.date = Date
+    body = topo_bodies[name]
+    body.compute(topo_obs)
+    st = (body.dec, body.ha, body.radius)
+    topocache[key] = st
+    if len(topocache) > toposize:
+        topocache.popitem(last=False)
+    return st
+
+def riseset(name, lat, start, horizon, rising, direction = 1):
+    # returns the next (direction = 1) or previous (direction = -1) rising (rising = True)
+    # or setting of the Sun or Moon ('name') after 'start' at latitude 'lat' (in full degrees)
+    # as a RiseSet
+    latitude = ephem.degrees('{}:00:00.0'.format(lat))
+    horizon = ephem.degrees(horizon)
+    key = (name, latitude+0.0, float(start), horizon+0.0, rising, direction)
+    res = risecache.get(key)
+    if res is not None:
+        risecache.move_to_end(key)
+        return res
+    res = stored(key, start)
+    if res is None:
+        res = risesearch(name, latitude, start, horizon, rising, direction)
+    risecache[key] = res
+    if len(risecache) > risesize:
+        risecache.popitem(last=False)
+    return res
+
+def risesearch(name, latitude, start, horizon, rising, direction):
+    # performs the rise/set search for riseset(); returns a RiseSet
+    if not riset_replica:
+        obs = ephem.Observer()
+        obs.pressure = 0
+        obs.lat = latitude
+        obs.horizon = horizon
+        obs.date = start
+        search = {(True,1): obs.next_rising, (False,1): obs.next_setting,
+                  (True,-1): obs.previous_rising, (False,-1): obs.previous_setting}
+        try:
+            return RiseSet(search[(rising,direction)](topo_bodies[name]), 0)
+        except ephem.AlwaysUpError:
+            return RiseSet(None, +1)
+        except ephem.NeverUpError:
+            return RiseSet(None, -1)
+    date = ephem.date(start)
+    prev_ha = None
+    for _ in ephem.rise_set_iterations:
+        dec, ha, radius = topostate(name, latitude, date)
+        alt = horizon - radius
+        arg = (sin(alt) - sin(latitude) * sin(dec)) / (cos(latitude) * cos(dec))
+        if arg < -1.0:
+            abs_target_ha = ephem._slightly_more_than_pi
+        elif arg > 1.0:
+            abs_target_ha = ephem._slightly_less_than_zero
+        else:
+            abs_target_ha = acos(arg)
+        target_ha = -abs_target_ha if rising else abs_target_ha
+        difference = target_ha - ha
+        if prev_ha is None:
+            difference %= 2*pi
+            if direction < 0:
+                difference -= 2*pi
+            bump = difference / (2*pi)
+            if abs(bump) < ephem.default_newton_precision:
+                bump += direction
+        else:
+            bump = ephem._plusminus_pi(difference) / (2*pi)
+        if abs(bump) < ephem.default_newton_precision:
+            break
+        date += bump
+        prev_ha = ha
+    if abs_target_ha == ephem._slightly_more_than_pi:
+        return RiseSet(None, +1)
+    if abs_target_ha == ephem._slightly_less_than_zero:
+        return RiseSet(None, -1)
+    return RiseSet(ephem.date(date), 0)
+
 #--------------------
 #   TWILIGHT table
 #--------------------
@@ -446,166 +813,92 @@ Markab,f|S|B9,23:04:45.65|60.40,15:12:18.96|-41.30,2.48,2000,0
 # create a list of 'sun above/below horizon' states per Latitude per Normal/Civil/Naut...
 #sunvisible = [[None]*3 for i in range(31)]	# sunvisible[0][0] up to sunvisible[30][2]
 
-def twilight(Date, lat, hemisph, round2seconds = False):   # used in twilighttab (section 1)
-    # Returns for given date and latitude(in full degrees):
+def sunevents(Date, lats, round2seconds = False):
+    # returns an array [latitude, event] of ephem dates for the given latitudes (in full degrees):
     # naut. and civil twilight (before sunrise), sunrise, meridian passage, sunset, civil and nautical twilight (after sunset).
-    # NOTE: 'twilight' is only called for every third day in the Full Almanac...
-    #       ...therefore daily tracking of the sun state is impossible.
-
-    mth = ephem.date(Date).triple()[1]
-    out = [0,0,0,0,0,0,0]
-    obs = ephem.Observer()
-    latitude = ephem.degrees('{}:00:00.0'.format(lat))
-    obs.lat = latitude
+    # NaN indicates that there is no such event (the Sun is continually above or below the horizon).
 
     if round2seconds:
         d = ephem.date(Date) - 0.5 * ephem.second   # search from 0.5 seconds before midnight
     else:
         d = ephem.date(Date) - 30 * ephem.second    # search from 30 seconds before midnight
 
-    obs.date = d
+    r = bodystate('sun', d).radius
+    horizons = [(2, 4, '-0:34'),                    # 34' (atmospheric refraction)
+                (1, 5, ephem.degrees('-6')+r),      # Civil twilight...
+                (0, 6, ephem.degrees('-12')+r)]     # Nautical twilight...
+    out = np.full((len(lats), 7), np.nan)
+    obs = ephem.Observer()
     obs.pressure = 0
-    s = ephem.Sun(obs)
-    s.compute(d)
-    r = s.radius
-    abhd = False                                # above/below horizon display NOT enabled
+    s = ephem.Sun()
+    for k, lat in enumerate(lats):
+        for begin, end, horizon in horizons:
+            ev = riseset('sun', lat, d, horizon, True)
+            if ev.state == 0:
+                out[k,begin] = ev.date
+            ev = riseset('sun', lat, d, horizon, False)
+            if ev.state == 0:
+                out[k,end] = ev.date
+        obs.lat = ephem.degrees('{}:00:00.0'.format(lat))
+        obs.date = d
+        out[k,3] = obs.next_transit(s)
+    return out
 
-    obs.horizon = '-0:34'   # 34' (atmospheric refraction)
-    try:
-        out[2] = date2time(obs.next_rising(s), round2seconds)	# sunrise
-    except:
-        out[2] = '--:--'
-    obs.date = d
-    try:
-        out[4] = date2time(obs.next_setting(s), round2seconds)	# sunset
-    except:
-        out[4] = '--:--'
-    if out[2] == '--:--' and out[4] == '--:--':	# if neither sunrise nor sunset...
-        abhd = True                             # enable above/below horizon display
-        if config.search_next_rising_sun:
-            yn = getsunstate(Date, lat, 0)      # ... get the sun state
-        else:
-            yn = midnightsun(mth, hemisph)
-        out[2] = yn
-        out[4] = yn
-#-----------------------------------------------------------
-    obs.horizon = ephem.degrees('-6')+r		    # Civil twilight...
-    obs.date = d
-    try:
-        out[1] = date2time(obs.next_rising(s), round2seconds)	# begin
-    except:
-        out[1] = '--:--'
-    obs.date = d
-    try:
-        out[5] = date2time(obs.next_setting(s), round2seconds)	# end
-    except:
-        out[5] = '--:--'
-    if abhd and out[1] == '--:--' and out[5] == '--:--':	# if neither begin nor end...
-        if config.search_next_rising_sun:
-            yn = getsunstate(Date, lat, 1)      # ... get the sun state
-        else:
-            yn = midnightsun(mth, hemisph)
-        out[1] = yn
-        out[5] = yn
-#-----------------------------------------------------------
-    obs.horizon = ephem.degrees('-12')+r	    # Nautical twilight ...
-    obs.date = d
-    try:
-        out[0] = date2time(obs.next_rising(s), round2seconds)	# begin
-    except:
-        out[0] = '--:--'
-    obs.date = d
-    try:
-        out[6] = date2time(obs.next_setting(s), round2seconds)	# end
-    except:
-        out[6] = '--:--'
-    if abhd and out[0] == '--:--' and out[6] == '--:--':	# if neither begin nor end...
-        if config.search_next_rising_sun:
-            yn = getsunstate(Date, lat, 2)      # ... get the sun state
-        else:
-            yn = midnightsun(mth, hemisph)
-        out[0] = yn
-        out[6] = yn
-#-----------------------------------------------------------
-    obs.date = d
-    out[3] = date2time(obs.next_transit(s), round2seconds)
-    
+def sunstates(Date, lat, ev):
+    # returns the Sun's state for sunrise/sunset, civil and nautical twilight at latitude
+    # 'lat' (in full degrees) given the events 'ev' of that day (see sunevents):
+    # 0 = both events shown as times, +1 = continually above and -1 = continually below
+    # the horizon, 2 = the begin and/or end does not occur on this day and is shown as
+    # '--:--' (e.g. a twilight that does not end while the Sun also rises and sets).
+    # NOTE: 'twilight' is only called for every third day in the Full Almanac...
+    #       ...therefore daily tracking of the sun state is impossible.
+
+    state = [0, 0, 0]
+    abhd = np.isnan(ev[2]) and np.isnan(ev[4])	# if neither sunrise nor sunset...
+    for h, (begin, end) in enumerate([(2,4),(1,5),(0,6)]):
+        if abhd and np.isnan(ev[begin]) and np.isnan(ev[end]):	# if neither begin nor end...
+            state[h] = 1 if sunstate(Date, lat, h) else -1  # ... get the sun state
+        elif np.isnan(ev[begin]) or np.isnan(ev[end]):
+            state[h] = 2
+    return state
+
+def formattwilight(ev, state, round2seconds = False):
+    # returns the formatted twilight times (see twilight) of the events 'ev' and sun states 'state'
+
+    out = ['--:--' if np.isnan(t) else date2time(ephem.date(t), round2seconds) for t in ev]
+    for h, (begin, end) in enumerate([(2,4),(1,5),(0,6)]):
+        if abs(state[h]) == 1:
+            yn = formatsun('--:--', state[h] > 0, True)
+            out[begin] = yn
+            out[end] = yn
     return out
 
-def getsunstate(d, lat, h):
-    # populate the sun state (visible or not) for the specified date & latitude
-    # note: the first parameter 'd' is an ephem date at midnight
-    # note: getsunstate is called when there is neither a sunrise nor a sunset on 'd'
+def twilight(Date, lat, round2seconds = False):   # used in twilighttab (section 1)
+    # Returns for given date and latitude(in full degrees):
+    # naut. and civil twilight (before sunrise), sunrise, meridian passage, sunset, civil and nautical twilight (after sunset).
 
-    i = config.lat.index(lat)
-    latitude = ephem.degrees('{}:00:00.0'.format(lat))
-    obs = ephem.Observer()
-    #d = ephem.date(d) - 30 * ephem.second
-    obs.pressure = 0
-    s = ephem.Sun(obs)
-    err = False
-    obs.date = d
-    obs.lat = latitude
-    s.compute(d)
-    sunup = False
+    ev = sunevents(Date, [lat], round2seconds)[0]
+    return formattwilight(ev, sunstates(Date, lat, ev), round2seconds)
 
-    if h == 0:
-        obs.horizon = '-0:34'					# sunrise/sunset
-    if h == 1:
-        r = s.radius
-        obs.horizon = ephem.degrees('-6')+r		# Civil twilight...
-    if h == 2:
-        r = s.radius
-        obs.horizon = ephem.degrees('-12')+r	# Nautical twilight...
-        
-    nextrising = d + 100.0	# in case sunset but no next sunrise
-    nextsetting = d + 100.0	# in case sunrise but no next sunset
+def sunstate(Date, lat, h):
+    # returns True if the Sun is continually above, False if continually below the horizon
+    # on the day 'Date' at latitude 'lat' (in full degrees) for h = 0 (sunrise/sunset),
+    # h = 1 (civil twilight) or h = 2 (nautical twilight).
+    # note: sunstate is called when there is neither a rising nor a setting on 'Date', so
+    #       the Sun is on the same side of the horizon all day. It is above if it is above
+    #       for more than half of the day at the Sun's declination at midday, i.e. if
+    #       sin(horizon) < sin(lat)*sin(dec). This needs no search, unlike PyEphem's
+    #       AlwaysUpError/NeverUpError, and holds right up to the first/last polar day.
 
-    try:
-        nextrising  = obs.next_rising(s)
-    except ephem.NeverUpError:
-        err = True
-        #print("nr NeverUp",i,h,d)
-        sunup = False
-        #sunvisible[i][h] = False
-    except ephem.AlwaysUpError:
-        err = True
-        #print("nr AlwaysUp",i,h,d)
-        sunup = True
-        #sunvisible[i][h] = True
-    except Exception:
-        flag_msg("Oops! sun nextR {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-        #sys.exc_clear()		# only in Python 2
-
-    obs.date = d
-    if not(err):	# note - 'nextrising' above *should* fail
-        try:
-            nextsetting = obs.next_setting(s)
-        except ephem.NeverUpError:
-            err = True
-            #print("ns NeverUp",i,h,d)
-            sunup = False
-            #sunvisible[i][h] = False
-        except ephem.AlwaysUpError:
-            err = True
-            #print("ns AlwaysUp",i,h,d)
-            sunup = True
-            #sunvisible[i][h] = True
-        except Exception:
-            flag_msg("Oops! sun nextS {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    if not(err):	# note - "err == True" *is* expected...
-        # however if we found both, which occured first?
-        sunup = False
-        #sunvisible[i][h] = False
-        if nextrising > nextsetting:
-            sunup = True
-            #sunvisible[i][h] = True
-        #print("{}".format(i), nextrising, nextsetting, sunvisible[i][h])
-
-    # return the current sunstate
-    return formatsun('--:--', sunup, True)
+    latitude = ephem.degrees('{}:00:00.0'.format(lat))
+    if h == 0:
+        horizon = ephem.degrees('-0:34') - bodystate('sun', Date).radius   # upper limb
+    elif h == 1:
+        horizon = ephem.degrees('-6')       # Civil twilight...
+    else:
+        horizon = ephem.degrees('-12')      # Nautical twilight...
+    dec = bodystate('sun', ephem.date(Date) + 0.5).g_dec
+    return sin(horizon) < sin(latitude) * sin(dec)
 
 ##NEW##
 def formatsun(t, sunup, ab_enabled):
@@ -619,376 +912,163 @@ def formatsun(t, sunup, ab_enabled):
     if not ab_enabled:      # if above/below horizon display enabled
         return t
     elif sunup:
-        return r'''\begin{tikzpicture}\draw (0,0) rectangle (12pt,4pt);\end{tikzpicture}'''
+        return r'''\UP'''
     else:
-        return r'''\rule{12Pt}{4Pt}'''
-
-def midnightsun(mth, hemisph):
-    # simple way to fudge whether the sun is up or down when there's no
-    # sunrise or sunset on a day depending on the month and hemisphere only.
-    # Note: this works for the chosen latitudes to be calculated.
-
-    sunup = False
-    if mth > 3 and mth < 10:    # if April to September inclusive
-        sunup = True
-    if hemisph == 'S':
-        sunup = not(sunup)
-    return formatsun('--:--', sunup, True)
+        return r'''\DN'''
 
 #-------------------------
 #   MOONRISE/-SET table
 #-------------------------
 
-# create a list of 'moon above/below horizon' states per Latitude...
+# The moon's state (above or below the horizon) on a day without moonrise or moonset
+# is determined from the rise/set searches of that day itself, so that a page
+# does not depend on the pages generated before it.
 #    None = unknown; True = above horizon (visible); False = below horizon (not visible)
-#    moonvisible[0] is not linked to a latitude but a manual override
-moonvisible = [None] * 32       # moonvisible[0] up to moonvisible[31]
 
 def moonrise_set(Date, lat):    # used by tables.py in twilighttab (section 2)
     # - - - TIMES ARE ROUNDED TO MINUTES - - -
     # returns moonrise and moonset for the given date and latitude plus next 2 days:
     #    rise day 1, rise day 2, rise day 3, set day 1, set day 2, set day 3
-    # Additionally it also tracks the current state of the moon (above or below horizon)
+    # Additionally it also determines the state of the moon (above or below horizon)
 
-    i = 1 + config.lat.index(lat)   # index 0 is reserved to enable an explicit setting
     out  = ['--:--','--:--','--:--','--:--','--:--','--:--']	# first event
     out2 = ['--:--','--:--','--:--','--:--','--:--','--:--']	# second event on same day (rare)
 
-    obs = ephem.Observer()
-    latitude = ephem.degrees('{}:00:00.0'.format(lat))
-    obs.lat = latitude
-    obs.pressure = 0
-    obs.horizon = '-0:34'       # 34' (atmospheric refraction)
-    d = ephem.date(Date) - 30 * ephem.second    # search from 30 seconds before midnight
-    obs.date = d
-    m = ephem.Moon(obs)
-    m.compute(d)
-#-----------------------------------------------------------
-    # Moonrise/Moonset on 1st. day ...
-    try:
-        firstrising = obs.next_rising(m)
-        if firstrising-obs.date >= 1:
-            raise ValueError('event next day')
-        out[0] = date2time(firstrising)		# note: overflow to 00:00 next day is correct here
-        lastevent = firstrising
-        moonvisible[i] = True
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[0] = '--:--'
-        lastevent = 0
-
-    if out[0] != '--:--':
-        try:
-            nextr = obs.next_rising(m, start=firstrising)
-            if nextr-obs.date < 1:
-                out2[0] = date2time(nextr)   # note: overflow to 00:00 next day is correct here
-                lastevent = nextr
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    obs.date = d
-    try:
-        firstsetting = obs.next_setting(m)
-        if firstsetting-obs.date >= 1:
-            raise ValueError('event next day')
-        out[3] = date2time(firstsetting)		# note: overflow to 00:00 next day is correct here
-        if firstsetting > lastevent:
-            lastevent = firstsetting
-            moonvisible[i] = False
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[3] = '--:--'
-
-    if out[3] != '--:--':
-        try:
-            nexts = obs.next_setting(m, start=firstsetting)
-            if nexts-obs.date < 1:
-                out2[3] = date2time(nexts)	# note: overflow to 00:00 next day is correct here
-            if nexts > lastevent:
-                moonvisible[i] = False
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    if out[0] == '--:--' and out[3] == '--:--':	# if neither moonrise nor moonset...
-        if moonvisible[i] == None:
-            getmoonstate(d, lat)			# ...get moon state if unknown
-        out[0] = moonstate(i)
-        out[3] = moonstate(i)
-
-    if out[0] == '--:--' and out[3] != '--:--':	# if moonset but no moonrise...
-        out[0] = moonset_no_rise(d, Date, i, lat)
-
-    if out[0] != '--:--' and out[3] == '--:--':	# if moonrise but no moonset...
-        out[3] = moonrise_no_set(d, Date, i, lat)
-
-#-----------------------------------------------------------
-    # Moonrise/Moonset on 2nd. day ...
-    d = ephem.date(Date + 1) - 30 * ephem.second
-    obs.date = d
-    m.compute(d)
-    try:
-        firstrising = obs.next_rising(m)
-        if firstrising-obs.date >= 1:
-            raise ValueError('event next day')
-        out[1] = date2time(firstrising)		# note: overflow to 00:00 next day is correct here
-        lastevent = firstrising
-        moonvisible[i] = True
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[1] = '--:--'
-        lastevent = 0
-
-    if out[1] != '--:--':
-        try:
-            nextr = obs.next_rising(m, start=firstrising)
-            if nextr-obs.date < 1:
-                out2[1] = date2time(nextr)	# note: overflow to 00:00 next day is correct here
-                lastevent = nextr
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    obs.date = d
-    try:
-        firstsetting = obs.next_setting(m)
-        if firstsetting-obs.date >= 1:
-            raise ValueError('event next day')
-        out[4] = date2time(firstsetting)		# note: overflow to 00:00 next day is correct here
-        if firstsetting > lastevent:
-            lastevent = firstsetting
-            moonvisible[i] = False
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[4] = '--:--'
-
-    if out[4] != '--:--':
-        try:
-            nexts = obs.next_setting(m, start=firstsetting)
-            if nexts-obs.date < 1:
-                out2[4] = date2time(nexts)	# note: overflow to 00:00 next day is correct here
-            if nexts > lastevent:
-                moonvisible[i] = False
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    if out[1] == '--:--' and out[4] == '--:--':	# if neither moonrise nor moonset...
-        if moonvisible[i] == None:
-            getmoonstate(d, lat)			# ...get moon state if unknown
-        out[1] = moonstate(i)
-        out[4] = moonstate(i)
-
-    if out[1] == '--:--' and out[4] != '--:--':	# if moonset but no moonrise...
-        out[1] = moonset_no_rise(d, Date+1, i, lat)
-
-    if out[1] != '--:--' and out[4] == '--:--':	# if moonrise but no moonset...
-        out[4] = moonrise_no_set(d, Date+1, i, lat)
-
-#-----------------------------------------------------------
-    # Moonrise/Moonset on 3rd. day ...
-    d = ephem.date(Date + 2) - 30 * ephem.second
-    obs.date = d
-    m.compute(d)
-    try:
-        firstrising = obs.next_rising(m)
-        if firstrising-obs.date >= 1:
-            raise ValueError('event next day')
-        out[2] = date2time(firstrising)		# note: overflow to 00:00 next day is correct here
-        lastevent = firstrising
-        moonvisible[i] = True
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[2] = '--:--'
-        lastevent = 0
-
-    if out[2] != '--:--':
-        try:
-            nextr = obs.next_rising(m, start=firstrising)
-            if nextr-obs.date < 1:
-                out2[2] = date2time(nextr)	# note: overflow to 00:00 next day is correct here
-                lastevent = nextr
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
+    for k in range(3):
+        d = ephem.date(Date + k) - 30 * ephem.second    # search from 30 seconds before midnight
+        out[k], out[k+3], out2[k], out2[k+3] = moonday(Date+k, d, lat)
+    return out, out2
 
-    obs.date = d
-    try:
-        firstsetting = obs.next_setting(m)
-        if firstsetting-obs.date >= 1:
-            raise ValueError('event next day')
-        out[5] = date2time(firstsetting)		# note: overflow to 00:00 next day is correct here
-        if firstsetting > lastevent:
-            lastevent = firstsetting
-            moonvisible[i] = False
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[5] = '--:--'
-
-    if out[5] != '--:--':
-        try:
-            nexts = obs.next_setting(m, start=firstsetting)
-            if nexts-obs.date < 1:
-                out2[5] = date2time(nexts)	# note: overflow to 00:00 next day is correct here
-            if nexts > lastevent:
-                moonvisible[i] = False
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
+def moonevents(Date, d, lat):
+    # returns the ephem dates of moonrise, moonset, second moonrise and second moonset (rare)
+    # on the day 'Date' for the given latitude, searching from 'd' (just before midnight),
+    # with NaN where there is no such event, and the states of the moonrise and moonset:
+    # 0 = shown as time, +1 = moon above horizon, -1 = moon below horizon and
+    # 2 = no event on this day, but on the days before and after.
+
+    t = [np.nan, np.nan, np.nan, np.nan]
+    state = [0, 0]
+    lastevent = 0
+    visible = None
+    # the horizon is at -0:34 (atmospheric refraction)
+
+    first = riseset('moon', lat, d, '-0:34', True)
+    if first.state == 0 and first.date-d < 1:
+        t[0] = first.date	# note: overflow to 00:00 next day is correct here
+        lastevent = first.date
+        visible = True
+        nextr = riseset('moon', lat, first.date, '-0:34', True)
+        if nextr.state == 0 and nextr.date-d < 1:
+            t[2] = nextr.date
+            lastevent = nextr.date
+
+    first = riseset('moon', lat, d, '-0:34', False)
+    if first.state == 0 and first.date-d < 1:
+        t[1] = first.date	# note: overflow to 00:00 next day is correct here
+        if first.date > lastevent:
+            lastevent = first.date
+            visible = False
+        nexts = riseset('moon', lat, first.date, '-0:34', False)
+        if nexts.state == 0:
+            if nexts.date-d < 1:
+                t[3] = nexts.date
+            if nexts.date > lastevent:
+                visible = False
+
+    if np.isnan(t[0]) and np.isnan(t[1]):	# if neither moonrise nor moonset...
+        visible = getmoonstate(d, lat)      # ...get the moon state
+        state = [moonflag(visible), moonflag(visible)]
+    elif np.isnan(t[0]):	# if moonset but no moonrise...
+        state[0] = moonset_no_rise(d, Date, visible, lat)
+    elif np.isnan(t[1]):	# if moonrise but no moonset...
+        state[1] = moonrise_no_set(d, Date, visible, lat)
+
+    return t, state
+
+def formatmoon(t, state, round2seconds = False):
+    # returns the formatted moonrise, moonset, second moonrise and second moonset
+    # of the event dates 't' and moonrise/moonset states 'state' (see moonevents)
 
-    if out[2] == '--:--' and out[5] == '--:--':	# if neither moonrise nor moonset...
-        if moonvisible[i] == None:
-            getmoonstate(d, lat)			# ...get moon state if unknown
-        out[2] = moonstate(i)
-        out[5] = moonstate(i)
+    out = []
+    for k in range(4):
+        s = state[k] if k < 2 else 0
+        if s == 2:
+            out.append(r'''\DOTS''')
+        elif s != 0:
+            out.append(moonstate(s > 0))
+        elif np.isnan(t[k]):
+            out.append('--:--')
+        else:
+            out.append(date2time(ephem.date(t[k]), round2seconds))
+    return out
 
-    if out[2] == '--:--' and out[5] != '--:--':	# if moonset but no moonrise...
-        out[2] = moonset_no_rise(d, Date+2, i, lat)
+def moonday(Date, d, lat, round2seconds = False):
+    # returns moonrise, moonset, second moonrise and second moonset (rare) on the day
+    # 'Date' for the given latitude, searching from 'd' (just before midnight).
 
-    if out[2] != '--:--' and out[5] == '--:--':	# if moonrise but no moonset...
-        out[5] = moonrise_no_set(d, Date+2, i, lat)
+    t, state = moonevents(Date, d, lat)
+    return formatmoon(t, state, round2seconds)
 
-    return out, out2
+def moonflag(visible):
+    # returns the moon state (see moonevents) for 'visible' (None = unknown: shown as '--:--')
+    if visible is None:
+        return 0
+    return 1 if visible else -1
 
-def moonstate(ndx):
-    # return the current moonstate (if known)
+def moonstate(visible):
+    # return the symbol for the moon state (if known)
     out = '--:--'
-    if moonvisible[ndx] == True:
+    if visible == True:
         #out = 'UP'
         #out = r'\framebox(12,4){}'
         #out = r'{\setlength{\fboxrule}{0.8pt}\setlength{\fboxsep}{0pt}\fbox{\makebox(12,4){}}}'
         #out = r'{\setlength{\fboxrule}{0.8pt}\fbox{\parbox[c][0pt]{0pt}{ }}}'
         #out = r'\includegraphics[scale=1.0]{./moonup.jpg}'
-        out = r'\begin{tikzpicture}\draw (0,0) rectangle (12pt,4pt);\end{tikzpicture}'
-    if moonvisible[ndx] == False:
+        #out = r'\begin{tikzpicture}\draw (0,0) rectangle (12pt,4pt);\end{tikzpicture}'
+        out = r'\UP'         # see symbolmacros
+    if visible == False:
         #out = 'DOWN'
-        out = r'\rule{12Pt}{4Pt}'
+        out = r'\DN'
     return out
 
 def getmoonstate(d, lat):
-    # populate the moon state (visible or not) for the specified date & latitude
+    # returns the moon state (True = visible) for the specified date & latitude
     # note: the first parameter 'd' is already an ephem date 30 seconds before midnight
     # note: getmoonstate is called when there is neither a moonrise nor a moonset on 'd'
 
-    i = 1 + config.lat.index(lat)   # index 0 is reserved to enable an explicit setting
-    latitude = ephem.degrees('{}:00:00.0'.format(lat))
-    obs = ephem.Observer()
-    #d = ephem.date(d) - 30 * ephem.second
-    obs.pressure = 0
-    obs.horizon = '-0:34'
-    m = ephem.Moon(obs)
-    err = False
-    obs.date = d
-    obs.lat = latitude
-    m.compute(d)
-    nextrising = d + 100.0	# in case moonset but no next moonrise
-    nextsetting = d + 100.0	# in case moonrise but no next moonset
+    nextrising = riseset('moon', lat, d, '-0:34', True)
+    if nextrising.state != 0:	# note - 'nextrising' *should* fail
+        return nextrising.state > 0
 
-    try:
-        nextrising  = obs.next_rising(m)
-    except ephem.NeverUpError:
-        err = True
-        #print("nr NeverUp")
-        moonvisible[i] = False
-    except ephem.AlwaysUpError:
-        err = True
-        #print("nr AlwaysUp")
-        moonvisible[i] = True
-    except Exception:
-        flag_msg("Oops! moon nextR {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-        #sys.exc_clear()		# only in Python 2
-
-    obs.date = d
-    if not(err):	# note - 'nextrising' above *should* fail
-        try:
-            nextsetting = obs.next_setting(m)
-        except ephem.NeverUpError:
-            err = True
-            #print("ns NeverUp")
-            moonvisible[i] = False
-        except ephem.AlwaysUpError:
-            err = True
-            #print("ns AlwaysUp")
-            moonvisible[i] = True
-        except Exception:
-            flag_msg("Oops! moon nextS {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    if not(err):	# note - "err == True" *is* expected...
-        # however if we found both, which occured first?
-        moonvisible[i] = False
-        if nextrising > nextsetting:
-            moonvisible[i] = True
-        #print("{}".format(i), nextrising, nextsetting, moonvisible[i])
-    return
+    nextsetting = riseset('moon', lat, d, '-0:34', False)
+    if nextsetting.state != 0:
+        return nextsetting.state > 0
+
+    # however if we found both, which occurs first?
+    return nextrising.date > nextsetting.date
 
 ##NEW##
-def moonset_no_rise(d, Date, i, lat):
-    # if moonset but no moonrise...
-    msg = ""
+def moonset_no_rise(d, Date, visible, lat):
+    # if moonset but no moonrise... returns the moonrise state (see moonevents)
     n = seek_moonrise(d, lat)
     if n == 1:
-        out = moonstate(i)       # moonrise "below horizon"
-        msg = "below horizon (start)"
+        out = moonflag(visible)  # moonrise "below horizon" (start)
     if n == -1:
-        #print("UP")
-        moonvisible[0] = True
-        out = moonstate(0)       # moonrise "above horizon"
-        msg = "above horizon (end)"
-        #print(out[0])
-    #if msg != "":
-        #print("no moonrise on {} at lat {} => {}".format(ephem.date(Date).datetime().strftime("%Y-%m-%d"), lat, msg))
+        out = 1                  # moonrise "above horizon" (end)
     if n == 0:
-        out = r'''\raisebox{0.24ex}{\boldmath$\cdot\cdot$~\boldmath$\cdot\cdot$}'''
+        out = 2
     return out
 
 ##NEW##
-def moonrise_no_set(d, Date, i, lat):
-    # if moonrise but no moonset...
-    msg = ""
+def moonrise_no_set(d, Date, visible, lat):
+    # if moonrise but no moonset... returns the moonset state (see moonevents)
     n = seek_moonset(d, lat)
     if n == 1:
-        out = moonstate(i)       # moonset "above horizon"
-        msg = "above horizon (start)"
+        out = moonflag(visible)  # moonset "above horizon" (start)
     if n == -1:
-        moonvisible[0] = False
-        out = moonstate(0)       # moonset "below horizon"
-        msg = "below horizon (end)"
-    #if msg != "":
-        #print("no moonset on  {} at lat {} => {}".format(ephem.date(Date).datetime().strftime("%Y-%m-%d"), lat, msg))
+        out = -1                 # moonset "below horizon" (end)
     if n == 0:
-        out = r'''\raisebox{0.24ex}{\boldmath$\cdot\cdot$~\boldmath$\cdot\cdot$}'''
+        out = 2
     return out
 
 ##NEW##
@@ -1002,58 +1082,26 @@ def seek_moonset(d, lat):
     m_set_t = 0     # normal case: assume moonsets yesterday & tomorrow
 
     i = 1 + config.lat.index(lat)   # index 0 is reserved to enable an explicit setting
-    latitude = ephem.degrees('{}:00:00.0'.format(lat))
-    obs = ephem.Observer()
-    #d = ephem.date(d) - 30 * ephem.second
-    obs.pressure = 0    # turn off PyEphem’s native mechanism for computing atmospheric refraction near the horizon
-    obs.horizon = '-0:34'
-    m = ephem.Moon(obs)
     err = False
-    obs.date = d
-    obs.lat = latitude
-    m.compute(d)
-    nextsetting = d + 10.0	# in case moonrise but no next moonset
 
-    try:
-        nextsetting = obs.next_setting(m)
-    except ephem.NeverUpError:
+    nextsetting = riseset('moon', lat, d, '-0:34', False)
+    if nextsetting.state < 0:
         err = True
-        #print("ns NeverUp")
-        flag_msg("Oops! moon nextS {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-    except ephem.AlwaysUpError:
+        flag_msg("Oops! moon nextS {}: moon never up at {}".format(i, d))
+    elif nextsetting.state > 0:
         err = True
         m_set_t = +1
-        #print("ns AlwaysUp")
-    except Exception:
-        flag_msg("Oops! moon nextS {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-        #sys.exc_clear()		# only in Python 2
-
-    if not(err):	# note - "err == True" *is* expected...
-        # moonset detected - is it after tomorrow?
-        if nextsetting > d + 2.0:
-            m_set_t = +1
+    elif nextsetting.date > d + 2.0:    # moonset detected - is it after tomorrow?
+        m_set_t = +1
 
-    obs.date = d
     if m_set_t == 0:
-        try:
-            prevsetting = obs.previous_setting(m)
-        except ephem.NeverUpError:
-            err = True
+        prevsetting = riseset('moon', lat, d, '-0:34', False, -1)
+        if prevsetting.state < 0:
+            m_set_t = -1
+        elif prevsetting.state > 0:
+            flag_msg("Oops! moon prevS {}: moon always up at {}".format(i, d))
+        elif not(err) and prevsetting.date < d - 1.0:   # moonset detected - is it before yesterday?
             m_set_t = -1
-            #print("ps NeverUp")
-        except ephem.AlwaysUpError:
-            err = True
-            #print("ps AlwaysUp")
-            flag_msg("Oops! moon prevS {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-        except Exception:
-            flag_msg("Oops! moon prevS {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-        if not(err):	# note - "err == True" *is* expected...
-            # moonset detected - is it before yesterday?
-            if prevsetting < d - 1.0:
-                m_set_t = -1
-        #print("m_set_t = {}".format(m_set_t))
     return m_set_t
 
 ##NEW##
@@ -1066,59 +1114,26 @@ def seek_moonrise(d, lat):
     m_rise_t = 0    # normal case: assume moonrise yesteray & tomorrow
 
     i = 1 + config.lat.index(lat)   # index 0 is reserved to enable an explicit setting
-    latitude = ephem.degrees('{}:00:00.0'.format(lat))
-    obs = ephem.Observer()
-    #d = ephem.date(d) - 30 * ephem.second
-    obs.pressure = 0
-    obs.horizon = '-0:34'
-    m = ephem.Moon(obs)
     err = False
-    obs.date = d
-    obs.lat = latitude
-    m.compute(d)
-    nextrising = d + 10.0	# in case moonset but no next moonrise
 
-    try:
-        nextrising  = obs.next_rising(m)
-    except ephem.NeverUpError:
+    nextrising = riseset('moon', lat, d, '-0:34', True)
+    if nextrising.state < 0:
         err = True
         m_rise_t = +1
-        #print("nr NeverUp")
-    except ephem.AlwaysUpError:
+    elif nextrising.state > 0:
         err = True
-        #print("nr AlwaysUp")
-        flag_msg("Oops! moon nextR {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-    except Exception:
-        flag_msg("Oops! moon nextR {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-        #sys.exc_clear()		# only in Python 2
-
-    if not(err):	# note - "err == True" *is* expected...
-        # moonrise detected - is it after tomorrow?
-        if nextrising > d + 2.0:
-            m_rise_t = +1
-
-    obs.date = d
+        flag_msg("Oops! moon nextR {}: moon always up at {}".format(i, d))
+    elif nextrising.date > d + 2.0:     # moonrise detected - is it after tomorrow?
+        m_rise_t = +1
+
     if m_rise_t == 0:
-        try:
-            prevrising = obs.previous_rising(m)
-        except ephem.NeverUpError:
-            err = True
-            #print("pr NeverUp")
-            flag_msg("Oops! moon prevR {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-        except ephem.AlwaysUpError:
-            err = True
+        prevrising = riseset('moon', lat, d, '-0:34', True, -1)
+        if prevrising.state < 0:
+            flag_msg("Oops! moon prevR {}: moon never up at {}".format(i, d))
+        elif prevrising.state > 0:
+            m_rise_t = -1
+        elif not(err) and prevrising.date < d - 1.0:    # moonrise detected - is it before yesterday?
             m_rise_t = -1
-            #print("pr AlwaysUp")
-        except Exception:
-            flag_msg("Oops! moon prevR {}: {} occured, line: {}".format(i,sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-        if not(err):	# note - "err == True" *is* expected...
-            # moonrise detected - is it before yesterday?
-            if prevrising < d - 1.0:
-                m_rise_t = -1
-
-        #print("m_rise_t = {}".format(m_rise_t))
     return m_rise_t
 
 #-------------------------
@@ -1128,105 +1143,64 @@ def seek_moonrise(d, lat):
 def moonrise_set2(Date, lat):    # used in twilighttab of eventtables.py
     # - - - TIMES ARE ROUNDED TO SECONDS - - -
     # returns moonrise and moonset for the given date and latitude:
-    #    rise time, set time
+    #    mrise time, mset time
     # Additionally it also tracks the current state of the moon (above or below horizon)
 
-    i = 1 + config.lat.index(lat)   # index 0 is reserved to enable an explicit setting
-    out  = ['--:--','--:--']	# first event
-    out2 = ['--:--','--:--']	# second event on same day (rare)
-
-    obs = ephem.Observer()
-    latitude = ephem.degrees('{}:00:00.0'.format(lat))
-    obs.lat = latitude
-    obs.pressure = 0
-    obs.horizon = '-0:34'       # 34' (atmospheric refraction)
     d = ephem.date(Date) - 0.5 * ephem.second   # search from 0.5 seconds before midnight
-    obs.date = d
-    m = ephem.Moon(obs)
-    m.compute(d)
-#-----------------------------------------------------------
-    # Moonrise/Moonset on the selected day ...
-    try:
-        firstrising = obs.next_rising(m)
-        if firstrising-obs.date >= 1:
-            raise ValueError('event next day')
-        out[0] = hhmmss(firstrising)		# note: overflow to 00:00 next day is correct here
-        lastevent = firstrising
-        moonvisible[i] = True
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[0] = '--:--'
-        lastevent = 0
-
-    if out[0] != '--:--':
-        try:
-            nextr = obs.next_rising(m, start=firstrising)
-            if nextr-obs.date < 1:
-                out2[0] = hhmmss(nextr)   # note: overflow to 00:00 next day is correct here
-                lastevent = nextr
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    obs.date = d
-    try:
-        firstsetting = obs.next_setting(m)
-        if firstsetting-obs.date >= 1:
-            raise ValueError('event next day')
-        out[1] = hhmmss(firstsetting)		# note: overflow to 00:00 next day is correct here
-        if firstsetting > lastevent:
-            lastevent = firstsetting
-            moonvisible[i] = False
-    except Exception:                   # includes NeverUpError and AlwaysUpError
-        out[1] = '--:--'
-
-    if out[1] != '--:--':
-        try:
-            nexts = obs.next_setting(m, start=firstsetting)
-            if nexts-obs.date < 1:
-                out2[1] = hhmmss(nexts)	# note: overflow to 00:00 next day is correct here
-            if nexts > lastevent:
-                moonvisible[i] = False
-        except UnboundLocalError:
-            pass
-        except ephem.NeverUpError:
-            pass
-        except ephem.AlwaysUpError:
-            pass
-        except Exception:
-            flag_msg("Oops! {} occured, line: {}".format(sys.exc_info()[1],sys.exc_info()[2].tb_lineno))
-            #sys.exc_clear()		# only in Python 2
-
-    if out[0] == '--:--' and out[1] == '--:--':	# if neither moonrise nor moonset...
-        if moonvisible[i] == None:
-            getmoonstate(d, lat)			# ...get moon state if unknown
-        out[0] = moonstate(i)
-        out[1] = moonstate(i)
-
-    if out[0] == '--:--' and out[1] != '--:--':	# if moonset but no moonrise...
-        out[0] = moonset_no_rise(d, Date, i, lat)
+    mrise, mset, mrise2, mset2 = moonday(Date, d, lat, True)
+    return [mrise, mset], [mrise2, mset2]
+
+#------------------------
+#   lunation table
+#------------------------
+
+# The principal moon phases are searched once and kept in ascending order in
+# 'lunations' as (ephem date, quarter) with quarter 0 = new moon, 1 = first quarter,
+# 2 = full moon and 3 = last quarter. The table is extended by whole lunations as
+# later (or earlier) dates are requested; the moon's age is then a bisection.
+
+lunations = []
+lunadates = []      # the dates in 'lunations' (for bisect)
+phasesearch = [ephem.next_first_quarter_moon, ephem.next_full_moon,
+               ephem.next_last_quarter_moon, ephem.next_new_moon]
+
+def lunationtable(first, last):
+    # extends the lunation table to cover the dates 'first' to 'last'
+    global lunations, lunadates
+
+    if not lunations:
+        lunations = [(ephem.previous_new_moon(first), 0)]
+    elif first < lunadates[0]:
+        table = [(ephem.previous_new_moon(first), 0)]
+        while table[-1][0] < lunadates[0] - 1:
+            q = table[-1][1]
+            table.append((phasesearch[q](table[-1][0]), (q+1)%4))
+        lunations = table[:-1] + lunations
+    while lunations[-1][0] <= last:
+        q = lunations[-1][1]
+        lunations.append((phasesearch[q](lunations[-1][0]), (q+1)%4))
+    lunadates = [x[0] for x in lunations]
+    return
 
-    if out[0] != '--:--' and out[1] == '--:--':	# if moonrise but no moonset...
-        out[1] = moonrise_no_set(d, Date, i, lat)
+def moonage(Date):
+    # returns the days since the previous new moon (as float)
 
-    return out, out2
+    lunationtable(Date, Date)
+    i = bisect_right(lunadates, Date) - 1
+    while lunations[i][1] != 0:
+        i -= 1
+    return Date - lunadates[i]
 
 #------------------------------
 #   Equation of Time section
 #------------------------------
 
-def equation_of_time(Date, round2seconds = False): # used in twilighttab (section 3)
-    # returns equation of time, the sun's transit time, 
-    # the moon's transit-, antitransit-time, age and percent illumination.
+def eqtdata(Date, round2seconds = False, grid = None):
+    # returns equation of time at 00h and 12h (radians, rounded to the second), the sun's transit,
+    # the moon's transit and antitransit (ephem dates; NaN if not on 'Date'), the moon's age (days)
+    # and percent illumination.
     # (Equation of Time = Mean solar time - Apparent solar time)
-
-    py_date = Date.tuple()
-    py_obsdate = date(py_date[0], py_date[1], py_date[2])
+    # Transits are taken from the hourly 'grid' of the sun and moon where it covers them.
 
     if round2seconds:
         # !! transit times are rounded to the nearest second,
@@ -1239,49 +1213,48 @@ def equation_of_time(Date, round2seconds = False): # used in twilighttab (sectio
         # !! e.g. after 23h 59m 30s rounds up to 00:00 next day
         d = ephem.date(Date) - 30 * ephem.second
 
-    obs = ephem.Observer()
-    obs.date = d
-    ephem_sun.compute(d)
-    ephem_moon.compute(d)
-    transs = '--:--'
-    antim  = '--:--'
-    transm = '--:--'
+    transs = np.nan
+    antim  = np.nan
+    transm = np.nan
 
-    next_s_tr = obs.next_transit(ephem_sun,start=d)
-    if next_s_tr - obs.date < 1:
-        transs = date2time(next_s_tr, round2seconds)
+    next_s_tr = transit(grid, 'sun', d, 0.0, round2seconds)
+    if next_s_tr - d < 1:
+        transs = next_s_tr
 
-    next_m_atr = obs.next_antitransit(ephem_moon,start=d)
-    if next_m_atr - obs.date < 1:
-        antim = date2time(next_m_atr, round2seconds)
+    next_m_atr = transit(grid, 'moon', d, pi, round2seconds)
+    if next_m_atr - d < 1:
+        antim = next_m_atr
 
-    next_m_tr = obs.next_transit(ephem_moon,start=d)
-    if next_m_tr - obs.date < 1:
-        transm = date2time(next_m_tr, round2seconds)
+    next_m_tr = transit(grid, 'moon', d, 0.0, round2seconds)
+    if next_m_tr - d < 1:
+        transm = next_m_tr
 
 #-----------------------------
-    obs = ephem.Observer()
-    obs.date = Date
-    
-    ephem_moon.compute(Date)
-    pct = int(round(ephem_moon.phase))   # percent of moon surface illuminated
-    age = int(round((Date+0.5)-ephem.previous_new_moon(Date+0.5)))
-    phase = ephem_moon.elong.norm+0.0    # moon phase as float (0:new to π:full to 2π:new)
-    
-    ephem_sun.compute(Date-0.1)
-    obs.date = Date-0.1
+    pct = bodystate('moon', Date).phase     # percent of moon surface illuminated
+    age = moonage(Date+0.5)
 
     # round to the second; convert back to days
-    x = round((obs.next_antitransit(ephem_sun)-Date)*86400)*2*pi/86400
+    x = round((transit(grid, 'sun', Date-0.1, pi, True)-Date)*86400)*2*pi/86400
+    y = round((transit(grid, 'sun', Date-0.1, 0.0, True)-(Date+0.5))*86400)*2*pi/86400
+    return x, y, transs, transm, antim, age, pct
+
+def formateqt(x, y, transs, transm, antim, age, pct, round2seconds = False):
+    # returns the formatted equation of time section (see eqtdata)
+
     eqt00 = ephem.hours(x)
     eqt00 = str(eqt00)[-8:-3]
     if x >= 0:
         eqt00 = r"\colorbox{{lightgray!60}}{{{}}}".format(eqt00)
 
-    y = round((obs.next_transit(ephem_sun)-(Date+0.5))*86400)*2*pi/86400
     eqt12 = ephem.hours(y)
     eqt12 = str(eqt12)[-8:-3]
     if y >= 0:
         eqt12 = r"\colorbox{{lightgray!60}}{{{}}}".format(eqt12)
 
-    return eqt00,eqt12,transs,transm,antim,age,pct
\ No newline at end of file
+    times = ['--:--' if np.isnan(t) else date2time(ephem.date(t), round2seconds) for t in [transs, transm, antim]]
+    return eqt00,eqt12,times[0],times[1],times[2],int(round(age)),int(round(pct))
+
+def equation_of_time(Date, round2seconds = False, grid = None): # used in twilighttab (section 3)
+    # returns equation of time, the sun's transit time, 
+    # the moon's transit-, antitransit-time, age and percent illumination.
+    return formateqt(*eqtdata(Date, round2seconds, grid), round2seconds)
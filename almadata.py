@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#   Copyright (C) 2022  Andrew Bauer
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# NOTE: the data of a page is computed once, by 'almanacdata', before any table of
+#       the page is rendered. It holds one NumPy array per quantity:
+#         data.grid         the hourly ephemerides (see hourgrid in alma_ephem.py)
+#         data.sun          [day, latitude, event] twilight and sunrise/sunset dates
+#         data.sunstate     [day, latitude, h] sun above/below horizon (see sunstates)
+#         data.moon         [day, latitude, event] moonrise/moonset dates
+#         data.moonstate    [day, latitude, k] moon above/below horizon (see moonevents)
+#         data.stars        SHA and Dec of the navigational stars (see stellar; only
+#                           for the nautical almanac, else None)
+#       and a DayData record per day with the daily values (data.day[day]).
+#       Dates are ephem dates (floats) and NaN indicates that there is no event.
+#       The table functions only format these values, with the '..._at' functions below.
+
+###### Third party imports ######
+import ephem
+import numpy as np
+
+###### Local application imports ######
+from alma_ephem import *
+import config
+
+#-------------------
+#   data records
+#-------------------
+
+class DayData:
+    # the daily values of a page
+    #   date            ephem date of the day (midnight)
+    #   aries           transit time of Aries (radians)
+    #   sha, mpass      SHA (radians) and meridian passage of Venus, Mars, Jupiter and Saturn
+    #   hp              horizontal parallax of Mars and Venus (arc minutes)
+    #   eqt00, eqt12    equation of time at 00h and 12h (radians)
+    #   suntransit      the Sun's meridian passage
+    #   moontransit     the Moon's upper meridian passage
+    #   moonlower       the Moon's lower meridian passage
+    #   age, pct        the Moon's age (days) and percent illumination
+    __slots__ = ('date', 'aries', 'sha', 'mpass', 'hp', 'eqt00', 'eqt12',
+                 'suntransit', 'moontransit', 'moonlower', 'age', 'pct')
+
+class AlmanacData:
+    # the computed data of 'days' days beginning at 'date' (see NOTE above)
+    __slots__ = ('date', 'days', 'round2seconds', 'lats', 'grid', 'day',
+                 'sun', 'sunstate', 'moon', 'moonstate', 'stars')
+
+#----------------------
+#   data computation
+#----------------------
+
+def almanacdata(Date, days, round2seconds = False, bodies = gridbodies, daily = True, twilightdays = None):
+    # returns the AlmanacData of 'days' days beginning at 'Date' for the latitudes in config.lat
+    #   round2seconds = True for event times rounded to the second (else to the minute)
+    #   bodies        = bodies in the hourly grid (None = no grid)
+    #   daily         = False if only the hourly grid is required
+    #   twilightdays  = the days (0 = first day) with twilight and sunrise/sunset data (None = all)
+
+    data = AlmanacData()
+    data.date = ephem.date(Date)
+    data.days = days
+    data.round2seconds = round2seconds
+    data.lats = list(config.lat)
+    data.grid = None
+    if bodies is not None:
+        data.grid = hourgrid(data.date, 24*days, bodies)
+    data.day = []
+    n = len(data.lats)
+    data.sun = np.full((days, n, 7), np.nan)
+    data.sunstate = np.zeros((days, n, 3), dtype=np.int8)
+    data.moon = np.full((days, n, 4), np.nan)
+    data.moonstate = np.zeros((days, n, 2), dtype=np.int8)
+    data.stars = None
+    if not daily:
+        return data
+
+    if twilightdays is None:
+        twilightdays = range(days)
+    if round2seconds:
+        early = 0.5 * ephem.second      # search from 0.5 seconds before midnight
+    else:
+        early = 30 * ephem.second       # search from 30 seconds before midnight
+
+    for k in range(days):
+        day = DayData()
+        day.date = ephem.date(data.date + k)
+        day.aries = ariesdata(day.date)
+        day.sha, day.mpass, day.hp = planetsdata(day.date, round2seconds, data.grid)
+        (day.eqt00, day.eqt12, day.suntransit, day.moontransit, day.moonlower,
+         day.age, day.pct) = eqtdata(day.date, round2seconds, data.grid)
+        data.day.append(day)
+
+        if k in twilightdays:
+            data.sun[k] = sunevents(day.date, data.lats, round2seconds)
+            for i, lat in enumerate(data.lats):
+                data.sunstate[k,i] = sunstates(day.date, lat, data.sun[k,i])
+        d = day.date - early
+        for i, lat in enumerate(data.lats):
+            data.moon[k,i], data.moonstate[k,i] = moonevents(day.date, d, lat)
+    return data
+
+#----------------------
+#   data formatting
+#----------------------
+
+def aries_at(data, k):      # used in planetstab(m)
+    # returns the transit time of Aries on day 'k'
+    return formataries(data.day[k].aries)
+
+def planets_at(data, k):    # used in starstab and meridiantab
+    # returns SHA and meridian passage for the navigational planets on day 'k' (as planetstransit does)
+    day = data.day[k]
+    return formatplanets(day.sha, day.mpass, day.hp, data.round2seconds)
+
+def twilight_at(data, k, i):
+    # returns the twilight and sunrise/sunset times on day 'k' at latitude 'i' (as twilight does)
+    return formattwilight(data.sun[k,i], data.sunstate[k,i], data.round2seconds)
+
+def moon_at(data, k, i):
+    # returns moonrise, moonset, second moonrise and second moonset on day 'k'
+    # at latitude 'i' (as moonday does)
+    return formatmoon(data.moon[k,i], data.moonstate[k,i], data.round2seconds)
+
+def equation_at(data, k):
+    # returns the equation of time section for day 'k' (as equation_of_time does)
+    day = data.day[k]
+    return formateqt(day.eqt00, day.eqt12, day.suntransit, day.moontransit, day.moonlower,
+                     day.age, day.pct, data.round2seconds)
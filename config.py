@@ -20,7 +20,14 @@
 # ================ EDIT LINES IN THIS SECTION ONLY ================
 
 pgsz = 'A4'     # page size 'A4' or 'Letter' (global variable)
-search_next_rising_sun = False   # 'False' = base it only on month and hemisphere
+chebyshev = False   # 'True' = hourly data from fitted Chebyshev series (faster; may differ by 0.1' at rounding boundaries)
+texjobs = 0         # maximum number of concurrent pdflatex runs for a range of years (0 = per CPU quota)
+pagecache = False   # 'True' = keep rendered pages in 'cachedir' and reuse them when tables are created again
+cachedir = "cache"  # folder of the page cache
+cachemax = 200      # maximum size of the page cache in MB (the least recently used pages are removed)
+staticcache = False # 'True' = keep the PDF of the (date independent) Increments and Corrections tables in 'cachedir'
+ephemstore = False  # 'True' = read computed ephemeris data from 'storedir' (filled with: pyalmanac.py --warm-cache YEAR)
+storedir = "store"  # folder of the ephemeris store
 
 # ================ DO NOT EDIT LINES BELOW HERE ================
 # Docker-related stuff...
@@ -42,6 +49,11 @@ LINUXpf = False     # system platform
 MACOSpf = False     # system platform
 FANCYhd = False     # 'True' if compatible with 'fancyhdr' package
 DPonly = False      # output data pages only
+jobs = 1            # number of processes generating pages (command line option --jobs N)
+split = 0           # double pages per chunk document of a nautical almanac year (0 = no split; --split N)
+lookahead = 0       # pages of a nautical almanac computed ahead while pages are rendered and written (0 = no pipeline; --pipeline N)
+texfmt = False      # load the preambles from precompiled TeX formats (command line option -fmt)
+texversion = ""     # first line of 'tex --version'
 
 # define global variables
 logfileopen = False
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#   Copyright (C) 2022  Andrew Bauer
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# NOTE: the almanac data (see almadata.py) is exported without any LaTeX as four tables:
+#         hourly    time, GHA of Aries and GHA, Dec, v, d, SD, magnitude of the Sun, Moon
+#                   and planets (with the Moon's HP)
+#         daily     Aries transit; SHA, Mer.pass of the planets and HP of Venus and Mars;
+#                   equation of time at 00h and 12h; the Sun's Mer.pass; the Moon's upper and
+#                   lower Mer.pass, age (at 12h) and percent illumination (at 00h)
+#         events    per day and latitude (config.lat): twilight, sunrise, sunset, moonrise
+#                   and moonset with their above/below horizon states
+#         stars     per day: SHA and Dec of the navigational stars (at 00h)
+#       Angles are in degrees, v, d, SD and HP in arc minutes, the equation of time in
+#       seconds of time and times in UTC (event times are not rounded). Events that do not
+#       occur are empty (CSV), null (JSON Lines) or NaN/NaT (NPZ). The states are
+#       0 = event time, +1 = above and -1 = below the horizon all day, 2 = no moonrise
+#       (moonset) on this day but on the days before and after, or for the Sun that the
+#       twilight begin and/or end (sunrise/sunset) does not occur on this day although
+#       the Sun is not above or below that horizon all day (see alma_ephem.py).
+#       CSV and JSON Lines are written as they are computed, one file per table; NPZ
+#       writes one compressed NumPy archive with an array per table column ('table.column').
+
+###### Standard library imports ######
+import csv
+import json
+from math import pi
+
+###### Third party imports ######
+import ephem
+import numpy as np
+
+###### Local application imports ######
+from alma_ephem import gridbodies, navstars, starpositions
+from almadata import almanacdata
+from pagepool import renderpages
+import config
+
+tables = ['hourly', 'daily', 'events', 'stars']
+formats = ['csv', 'jsonl', 'npz']
+epoch = np.datetime64('1899-12-31T12:00:00', 'ms')     # ephem date 0.0
+
+#----------------------
+#   internal methods
+#----------------------
+
+def datetimes(dates):
+    # converts ephem dates (NaN = no event) to NumPy datetimes in milliseconds (NaT)
+    d = np.asarray(dates, dtype=float)
+    ms = np.round(np.nan_to_num(d) * 86400000).astype(np.int64)
+    out = epoch + ms.astype('timedelta64[ms]')
+    out[np.isnan(d)] = np.datetime64('NaT')
+    return out
+
+def hourlycolumns(data):
+    # returns the hourly table of 'data' as a dict of columns
+    grid = data.grid
+    n = 24 * data.days          # the grid has one extra hour for v and d
+    cols = {'time': datetimes(grid['date'][:n]),
+            'aries_gha': np.degrees(grid['aries']['gha'][:n])}
+    for name in gridbodies:
+        eph = grid[name]
+        cols[name + '_gha'] = np.degrees(eph['gha'][:n])
+        cols[name + '_dec'] = np.degrees(eph['dec'][:n])
+        cols[name + '_v'] = eph['v'][:n]
+        cols[name + '_d'] = eph['d'][:n]
+        if name == 'moon':
+            cols['moon_hp'] = eph['hp'][:n]
+        cols[name + '_sd'] = eph['sd'][:n]
+        cols[name + '_mag'] = eph['mag'][:n]
+    return cols
+
+def dailycolumns(data):
+    # returns the daily table of 'data' as a dict of columns
+    days = data.day
+    cols = {'date': datetimes([d.date for d in days]),
+            'aries_mer_pass': datetimes([d.date + d.aries/(2*pi) for d in days])}
+    for j, name in enumerate(['venus','mars','jupiter','saturn']):
+        cols[name + '_sha'] = np.degrees([d.sha[j] for d in days])
+        cols[name + '_mer_pass'] = datetimes([d.mpass[j] for d in days])
+    cols['venus_hp'] = np.array([d.hp[1] for d in days])
+    cols['mars_hp'] = np.array([d.hp[0] for d in days])
+    cols['eqt_00h'] = np.array([d.eqt00 for d in days]) * 86400/(2*pi)
+    cols['eqt_12h'] = np.array([d.eqt12 for d in days]) * 86400/(2*pi)
+    cols['sun_mer_pass'] = datetimes([d.suntransit for d in days])
+    cols['moon_upper'] = datetimes([d.moontransit for d in days])
+    cols['moon_lower'] = datetimes([d.moonlower for d in days])
+    cols['moon_age'] = np.array([d.age for d in days])
+    cols['moon_phase'] = np.array([d.pct for d in days])
+    return cols
+
+def eventcolumns(data):
+    # returns the events table of 'data' (one row per day and latitude) as a dict of columns
+    n = len(data.lats)
+    cols = {'date': np.repeat(datetimes([d.date for d in data.day]), n),
+            'lat': np.tile(np.array(data.lats), data.days)}
+    for j, name in [(0,'naut_dawn'), (1,'civil_dawn'), (2,'sunrise'),
+                    (4,'sunset'), (5,'civil_dusk'), (6,'naut_dusk')]:
+        cols[name] = datetimes(data.sun[:,:,j].ravel())
+    for j, name in enumerate(['sunrise_state','civil_state','naut_state']):
+        cols[name] = data.sunstate[:,:,j].ravel()
+    for j, name in enumerate(['moonrise','moonset','moonrise2','moonset2']):
+        cols[name] = datetimes(data.moon[:,:,j].ravel())
+    for j, name in enumerate(['moonrise_state','moonset_state']):
+        cols[name] = data.moonstate[:,:,j].ravel()
+    return cols
+
+def starcolumns(data):
+    # returns the stars table of 'data' (one row per day and star) as a dict of columns
+    dates = [d.date for d in data.day]
+    sha, dec = starpositions(dates)     # indexed [star, date]
+    return {'date': np.repeat(datetimes(dates), len(navstars)),
+            'star': np.tile(np.array(navstars), len(dates)),
+            'sha': np.degrees(sha.T.ravel()),
+            'dec': np.degrees(dec.T.ravel())}
+
+def chunk(Date, days):
+    # returns the four tables of 'days' days beginning at 'Date' (in a worker process)
+    data = almanacdata(Date, days, True)     # True = event times as for rounding to seconds
+    return {'hourly': hourlycolumns(data), 'daily': dailycolumns(data),
+            'events': eventcolumns(data), 'stars': starcolumns(data)}
+
+def cell(x):
+    # returns an array element as a CSV/JSON value (None if there is no value)
+    if isinstance(x, np.datetime64):
+        return None if np.isnat(x) else str(x) + 'Z'
+    if isinstance(x, np.floating):
+        return None if np.isnan(x) else float('{:.10g}'.format(x))
+    if isinstance(x, np.integer):
+        return int(x)
+    return str(x)
+
+def rows(cols):
+    # yields the rows of a table as lists of CSV/JSON values
+    names = list(cols)
+    for i in range(len(cols[names[0]])):
+        yield [cell(cols[name][i]) for name in names]
+
+#--------------------------
+#   external entry point
+#--------------------------
+
+def export(first_day, days, fmt, fn):
+    # writes the almanac data of 'days' days beginning at 'first_day' in the format 'fmt':
+    #   csv/jsonl   one file per table: fn_hourly.csv, fn_daily.csv, ...
+    #   npz         fn.npz
+    # returns the list of files written
+
+    dfl = ephem.Date(r'''{}/{}/{}'''.format(first_day.year,first_day.month,first_day.day))
+    # three days per chunk (as a nautical almanac page; see hourgrid)
+    args = [(ephem.date(dfl + k), min(3, days - k)) for k in range(0, days, 3)]
+    chunks = renderpages(chunk, args, {})
+
+    if fmt == 'npz':
+        parts = {t: [] for t in tables}
+        for c in chunks:
+            for t in tables:
+                parts[t].append(c[t])
+        arrays = {}
+        for t in tables:
+            for name in parts[t][0]:
+                arrays[t + '.' + name] = np.concatenate([p[name] for p in parts[t]])
+        np.savez_compressed(fn + '.npz', **arrays)
+        return [fn + '.npz']
+
+    files = [fn + '_' + t + '.' + fmt for t in tables]
+    outf = [open(f, mode="w", encoding="utf8", newline="") for f in files]
+    writers = [csv.writer(f) for f in outf]
+    first = True
+    for c in chunks:
+        for t, f, w in zip(tables, outf, writers):
+            names = list(c[t])
+            if fmt == 'csv':
+                if first:
+                    w.writerow(names)
+                w.writerows(['' if x is None else x for x in row] for row in rows(c[t]))
+            else:
+                for row in rows(c[t]):
+                    f.write(json.dumps(dict(zip(names, row))) + '\n')
+        first = False
+    for f in outf:
+        f.close()
+    return files
@@ -29,6 +29,8 @@ import ephem
 
 ###### Local application imports ######
 from alma_ephem import *
+from almadata import *
+from pagepool import pagemap
 import config
 
 
@@ -53,11 +55,10 @@ def double_events_found(m1, m2):
     return dbl
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def twilighttab(date):
-    # returns the twilight and moonrise tables
+def twilighttab(data, day):
+    # returns the twilight and moonrise tables for day 'day' of 'data'
 
-    first_day = r'''{}/{}/{}'''.format(date.year,date.month,date.day)
-    dfl = ephem.Date(first_day)    # convert date to float
+    dfl = data.day[day].date
 
 # Twilight tables ...........................................
     #lat = [72,70,68,66,64,62,60,58,56,54,52,50,45,40,35,30,20,10,0, -10,-20,-30,-35,-40,-45,-50,-52,-54,-56,-58,-60]
@@ -93,7 +94,7 @@ def twilighttab(date):
 '''
     lasthemisph = ""
     j = 5
-    for i in config.lat:
+    for n, i in enumerate(data.lats):
         if i >= 0:
             hemisph = 'N'
         else:
@@ -106,8 +107,9 @@ def twilighttab(date):
                 tab = tab + r'''\rule{0pt}{2.6ex}
 '''
         lasthemisph = hemisph
-        twi = twilight(dfl, i, hemisph, True)      # True = round to seconds
-        moon, moon2 = moonrise_set2(dfl,i)
+        twi = twilight_at(data, day, n)
+        mrise, mset, mrise2, mset2 = moon_at(data, day, n)
+        moon, moon2 = [mrise, mset], [mrise2, mset2]
         if not(double_events_found(moon,moon2)):
             line = r'''\textbf{{{}}}'''.format(hs) + r''' {}$^\circ$'''.format(abs(i))
             line = line + r''' & {} & {} & {} & {} & {} & {} & {} & {} \\
@@ -150,11 +152,10 @@ def twilighttab(date):
     return tab
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def meridiantab(date):
+def meridiantab(data, day):
     # returns a table with ephemerides for the navigational stars
 
-    first_day = r'''{}/{}/{}'''.format(date.year,date.month,date.day)
-    dfl = ephem.Date(first_day)    # convert date to float
+    dfl = data.day[day].date
 
     # LaTeX SPACING: \enskip \quad \qquad
     out = r'''\quad
@@ -172,7 +173,7 @@ def meridiantab(date):
 \hline\multicolumn{{3}}{{|r|}}{{}}\\[-2.0ex]
 '''.format(datestr)
 
-    p = planetstransit(dfl, True)      # True = round to seconds
+    p = planets_at(data, day)
     m = m + r'''Venus & {} & {} \\
 '''.format(p[0],p[1])
     m = m + r'''Mars & {} & {} \\
@@ -191,11 +192,8 @@ def meridiantab(date):
     return out
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def equationtab(date, dpp):
-    # returns the Equation of Time section for 'date' and 'date+1'
-
-    first_day = r'''{}/{}/{}'''.format(date.year,date.month,date.day)
-    dfl = ephem.Date(first_day)    # convert date to float
+def equationtab(data):
+    # returns the Equation of Time section for the days of 'data'
 
     tab = r'''\begin{tabular}[t]{|r|ccc|ccc|}
 %\multicolumn{7}{c}{\normalsize{}}\\
@@ -209,9 +207,9 @@ def equationtab(date, dpp):
 '''
 
     nn = 0
-    while nn < dpp:
-        d = ephem.date(dfl+nn)
-        eq = equation_of_time(d, True)      # True = round to seconds
+    while nn < data.days:
+        d = data.day[nn].date
+        eq = equation_at(data, nn)
         nn += 1
         tab = tab + r'''{} & {} & {} & {} & {} & {} & {}({}\%) \\
 '''.format(d.datetime().strftime("%d"),eq[0],eq[1],eq[2],eq[3],eq[4],eq[5],eq[6])
@@ -252,13 +250,15 @@ def page(date, dpp=2):
 \begin{{scriptsize}}
 '''.format(str2)
 
-    date2 = date + timedelta(days=1)
-    page += twilighttab(date)
-    page += meridiantab(date)
+    first_day = r'''{}/{}/{}'''.format(date.year,date.month,date.day)
+    dfl = ephem.Date(first_day)    # convert date to float
+    data = almanacdata(dfl, dpp, True, None)     # True = round to seconds
+    page += twilighttab(data, 0)
+    page += meridiantab(data, 0)
     if dpp == 2:
-        page += twilighttab(date2)
-        page += meridiantab(date2)
-    page += equationtab(date,dpp)
+        page += twilighttab(data, 1)
+        page += meridiantab(data, 1)
+    page += equationtab(data)
 
     # to avoid "Overfull \hbox" messages, leave a paragraph end before the end of a size change. (This may only apply to tabular* table style) See lines below...
     page = page + r'''
@@ -270,7 +270,7 @@ def pages(first_day, dtp):
     # dtp = 0 if for entire year; = -1 if for entire month; else days to print
 
     # make almanac starting from 'date'
-    out = ''
+    args = []       # page arguments in date order
     dpp = 2         # 2 days per page maximum
     day1 = first_day
 
@@ -281,8 +281,8 @@ def pages(first_day, dtp):
             day2 = day1 + timedelta(days=1)
             if day2.year != yr:
                 dpp -= day2.day
-                if dpp <= 0: return out
-            out += page(day1, dpp)
+                if dpp <= 0: break
+            args.append((day1, dpp))
             day1 += timedelta(days=2)
             year = day1.year
     elif dtp == -1:     # if entire month
@@ -292,19 +292,19 @@ def pages(first_day, dtp):
             day2 = day1 + timedelta(days=1)
             if day2.month != m:
                 dpp -= day2.day
-                if dpp <= 0: return out
-            out += page(day1, dpp)
+                if dpp <= 0: break
+            args.append((day1, dpp))
             day1 += timedelta(days=2)
             mth = day1.month
     else:           # print 'dtp' days beginning with first_day
         i = dtp   # don't decrement dtp
         while i > 0:
             if i < 2: dpp = i
-            out += page(day1, dpp)
+            args.append((day1, dpp))
             i -= 2
             day1 += timedelta(days=2)
 
-    return out
+    return pagemap(page, args)
 
 #--------------------------
 #   external entry point
@@ -312,6 +312,7 @@ def pages(first_day, dtp):
 
 def makeEVtables(first_day, dtp):
     # make tables starting from first_day
+    # returns a generator of LaTeX fragments (the preamble, then page by page)
     # dtp = 0 if for entire year; = -1 if for entire month; else days to print
 
     if config.FANCYhd:
@@ -475,7 +476,9 @@ def makeEVnew(first_day, dtp):
 %\showboxbreadth=50  % use for logging
 %\showboxdepth=50    % use for logging
 %\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}
-\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py
+\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py'''
+    tex += symbolmacros     # \UP, \DN and \DOTS (see alma_ephem.py)
+    tex += r'''
 \begin{document}'''
 
     if not config.DPonly:
@@ -484,10 +487,10 @@ def makeEVnew(first_day, dtp):
     tex += r'''
 \pagestyle{datapage}  % the default page style for the document'''
 
-    tex += pages(first_day,dtp)
-    tex += r'''
+    yield tex
+    yield from pages(first_day,dtp)
+    yield r'''
 \end{document}'''
-    return tex
 
 # ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===
 # ===   ===   ===   ===   O L D   F O R M A T T I N G   ===   ===   ===   ===
@@ -611,13 +614,15 @@ def makeEVold(first_day, dtp):
 %\showboxbreadth=50  % use for logging
 %\showboxdepth=50    % use for logging
 %\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}
-\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py
+\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py'''
+    tex += symbolmacros     # \UP, \DN and \DOTS (see alma_ephem.py)
+    tex += r'''
 \begin{document}'''
 
     if not config.DPonly:
         tex += hdrEVold(first_day,dtp,tm1,bm1,lm1,rm1,vsep1,vsep2)
 
-    tex += pages(first_day,dtp)
-    tex += r'''
-\end{document}'''
-    return tex
\ No newline at end of file
+    yield tex
+    yield from pages(first_day,dtp)
+    yield r'''
+\end{document}'''
\ No newline at end of file
@@ -51,6 +51,8 @@ import ephem
 
 ###### Local application imports ######
 from alma_ephem import *
+from almadata import *
+from pagepool import pagemap
 import config
 
 #----------------------
@@ -124,7 +126,7 @@ def NSdecl(deg, hr, printNS, printDEG, modernFMT):
     if not(printDEG):
         deg = deg[10:]	# skip the degrees (always dd°mm.m) - note: the degree symbol '$^\circ$' is eight bytes long
         if (hr+3)%6 == 0:
-            deg = r'''\raisebox{0.24ex}{\boldmath$\cdot$~\boldmath$\cdot$~~}''' + deg
+            deg = r'''\DDOTS''' + deg
     if modernFMT:
         if printNS or hr%6 == 0:
             sdeg = r'''\textcolor{{blue}}{{{}}}'''.format(hemisph) + deg
@@ -165,11 +167,43 @@ def double_events_found(m1, m2):
             dbl = True
     return dbl
 
+def texmacros():
+    # returns the preamble macros for the table fragments that are repeated on every page:
+    #   \PLhead{day}, \SMhead{day}      the daily column headings of planetstab(m) and sunmoontab(m)
+    #   \PLvdm{v}{d}{m}                 v, d and magnitude of a planet (below its columns)
+    #   \GS                             row terminator with a gap after every sixth hour
+    #   \RC                             shaded row (modern style)
+    #   \DDOTS                          dots for an omitted degree of declination
+    # and the above/below horizon symbols (see symbolmacros in alma_ephem.py)
+    # note: the heading macros begin (or end) a table row, where spaces are ignored
+
+    tex = symbolmacros + r'''
+\newcommand{\DDOTS}{\raisebox{0.24ex}{\boldmath$\cdot$~\boldmath$\cdot$~~}}'''
+    if config.tbls == "m":
+        tex += r'''
+\newcommand{\PLhead}[1]{\multicolumn{1}{c}{\textbf{#1}} & \multicolumn{1}{c}{\textbf{GHA}} &&
+\multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c}{\textbf{Dec}} &&  \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c}{\textbf{Dec}} &&  \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c}{\textbf{Dec}} &&  \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c}{\textbf{Dec}}\\}
+\newcommand{\PLvdm}[3]{\multicolumn{2}{c}{\footnotesize{\(\nu\)#1$'$ \emph{d}#2$'$ m#3\hphantom{0}}}}
+\newcommand{\SMhead}[1]{\multicolumn{1}{c}{\textbf{#1}} & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c}{\textbf{Dec}} & & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c}{\textbf{\(\nu\)}} & \multicolumn{1}{c}{\textbf{Dec}} & \multicolumn{1}{c}{\textit{d}} & \multicolumn{1}{c}{\textbf{HP}}\\}
+\newcommand{\RC}{\rowcolor{LightCyan}}'''
+    else:
+        tex += r'''
+\newcommand{\PLhead}[1]{\hline
+\rule{0pt}{2.4ex}\textbf{#1} & \multicolumn{1}{c|}{\textbf{GHA}} & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c|}{\textbf{Dec}} & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c|}{\textbf{Dec}} & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c|}{\textbf{Dec}} & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c|}{\textbf{Dec}}\\
+\hline}
+\newcommand{\PLvdm}[3]{\multicolumn{2}{c|}{\(\nu\) #1$'$ \emph{d} #2$'$ m #3\hphantom{0}}}
+\newcommand{\SMhead}[1]{\hline
+\multicolumn{1}{|c|}{\rule{0pt}{2.6ex}\textbf{#1}} &\multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c|}{\textbf{Dec}}  & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c}{\(\nu\)} & \multicolumn{1}{c}{\textbf{Dec}} & \multicolumn{1}{c}{\textit{d}} & \multicolumn{1}{c|}{\textbf{HP}}\\
+\hline}
+\newcommand{\GS}{\\[2Pt]}'''
+    return tex
+
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def planetstab(dfloat):
+def planetstab(data):
     # generates a LaTeX table for the navigational plantets (traditional style)
     # OLD: \begin{tabular*}{0.74\textwidth}[t]{@{\extracolsep{\fill}}|c|r|rr|rr|rr|rr|}
     # OLD: \begin{tabular}[t]{|C{15pt}|r|rr|rr|rr|rr|}
+    dfloat = data.date
 
     tab = r'''\noindent
 \setlength{\tabcolsep}{5.8pt}  % default 6pt
@@ -177,12 +211,11 @@ def planetstab(dfloat):
 \multicolumn{1}{c}{\normalsize{}} & \multicolumn{1}{c}{\normalsize{Aries}} &  \multicolumn{2}{c}{\normalsize{Venus}}& \multicolumn{2}{c}{\normalsize{Mars}} & \multicolumn{2}{c}{\normalsize{Jupiter}} & \multicolumn{2}{c}{\normalsize{Saturn}}\\
 '''
     # note: 74% table width above removes "Overfull \hbox (1.65279pt too wide)"
+    grid = data.grid
     n = 0
     while n < 3:
         da = dfloat + n
-        tab = tab + r'''\hline
-\rule{{0pt}}{{2.4ex}}\textbf{{{}}} & \multicolumn{{1}}{{c|}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c|}}{{\textbf{{Dec}}}} & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c|}}{{\textbf{{Dec}}}} & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c|}}{{\textbf{{Dec}}}} & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c|}}{{\textbf{{Dec}}}}\\
-\hline\rule{{0pt}}{{2.6ex}}\noindent
+        tab = tab + r'''\PLhead{{{}}}\rule{{0pt}}{{2.6ex}}\noindent
 '''.format(ephem.date(da).datetime().strftime("%a"))
         h = 0
 
@@ -190,11 +223,9 @@ def planetstab(dfloat):
             # first populate an array of 24 hours with all data
             hourlydata = [[] for i in range(24)]
             while h < 24:
-                hourlydata[h] = planetsGHA(da)
-                da = da + ephem.hour
+                hourlydata[h] = planetsGHA_at(grid, 24*n+h)
                 h += 1
             # now print the data per hour
-            da = dfloat + n
             h = 0
             while h < 24:
                 eph = hourlydata[h]
@@ -224,35 +255,30 @@ def planetstab(dfloat):
                 lineterminator = r'''\\
 '''
                 if h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab = tab + line + lineterminator
                 h += 1
-                da = da + ephem.hour
 
         else:			# Positive/Negative Declinations
             while h < 24:
-                eph = planetsGHA(da)
+                eph = planetsGHA_at(grid, 24*n+h)
                 line = r'''{} & {} & {} & {} & {} & {} & {} & {} & {} & {}'''.format(h,eph[0],eph[1],eph[2],eph[3],eph[4],eph[5],eph[6],eph[7],eph[8])
                 lineterminator = r'''\\
 '''
                 if h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab = tab + line + lineterminator
                 h += 1
-                da = da + ephem.hour
 
-        vd = vdm_planets(dfloat + n)
+        vd = vdm_planets_at(grid, 24*n)
         tab = tab + r'''\hline
 \multicolumn{{2}}{{|c|}}{{\rule{{0pt}}{{2.4ex}}Mer.pass. {}}} & 
-\multicolumn{{2}}{{c|}}{{\(\nu\) {}$'$ \emph{{d}} {}$'$ m {}\hphantom{{0}}}} & 
-\multicolumn{{2}}{{c|}}{{\(\nu\) {}$'$ \emph{{d}} {}$'$ m {}\hphantom{{0}}}} & 
-\multicolumn{{2}}{{c|}}{{\(\nu\) {}$'$ \emph{{d}} {}$'$ m {}\hphantom{{0}}}} & 
-\multicolumn{{2}}{{c|}}{{\(\nu\) {}$'$ \emph{{d}} {}$'$ m {}\hphantom{{0}}}}\\
+\PLvdm{{{}}}{{{}}}{{{}}} & \PLvdm{{{}}}{{{}}}{{{}}} & \PLvdm{{{}}}{{{}}}{{{}}} & \PLvdm{{{}}}{{{}}}{{{}}}\\
 \hline
 \multicolumn{{10}}{{c}}{{}}\\
-'''.format(ariestransit(dfloat + n),vd[0],vd[1],vd[2],vd[3],vd[4],vd[5],vd[6],vd[7],vd[8],vd[9],vd[10],vd[11])
+'''.format(aries_at(data, n),vd[0],vd[1],vd[2],vd[3],vd[4],vd[5],vd[6],vd[7],vd[8],vd[9],vd[10],vd[11])
         # the phantom character '0' compensates the format with two decimal places in SFalmanac
         n += 1
 
@@ -261,8 +287,9 @@ def planetstab(dfloat):
     return tab
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def planetstabm(dfloat):
+def planetstabm(data):
     # generates a LaTeX table for the navigational plantets (modern style)
+    dfloat = data.date
 
     tab = r'''\vspace{6Pt}\noindent
 \renewcommand{\arraystretch}{1.1}
@@ -275,12 +302,12 @@ def planetstabm(dfloat):
 \multicolumn{2}{c}{\normalsize{Jupiter}} & & 
 \multicolumn{2}{c}{\normalsize{Saturn}}\\
 \cmidrule{2-2} \cmidrule{4-5} \cmidrule{7-8} \cmidrule{10-11} \cmidrule{13-14}'''
+    grid = data.grid
     n = 0
     while n < 3:
         da = dfloat + n
         tab = tab + r'''
-\multicolumn{{1}}{{c}}{{\textbf{{{}}}}} & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} && 
-\multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\textbf{{Dec}}}} &&  \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\textbf{{Dec}}}} &&  \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\textbf{{Dec}}}} &&  \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\textbf{{Dec}}}}\\
+\PLhead{{{}}}
 '''.format(ephem.date(da).datetime().strftime("%a"))
         h = 0
 
@@ -288,11 +315,9 @@ def planetstabm(dfloat):
             # first populate an array of 24 hours with all data
             hourlydata = [[] for i in range(24)]
             while h < 24:
-                hourlydata[h] = planetsGHA(da)
-                da = da+ephem.hour
+                hourlydata[h] = planetsGHA_at(grid, 24*n+h)
                 h += 1
             # now print the data per hour
-            da = dfloat + n
             h = 0
             while h < 24:
                 band = int(h/6)
@@ -324,36 +349,31 @@ def planetstabm(dfloat):
                 line = line + r'''{} && {} & {} && {} & {} && {} & {} && {} & {} \\
 '''.format(eph[0],eph[1],vdec,eph[3],mdec,eph[5],jdec,eph[7],sdec)
                 if group == 1:
-                    tab = tab + r'''\rowcolor{LightCyan}
+                    tab = tab + r'''\RC
 '''
                 tab = tab + line
                 h += 1
-                da = da + ephem.hour
 
         else:			# Positive/Negative Declinations
             while h < 24:
                 band = int(h/6)
                 group = band % 2
-                eph = planetsGHA(da)
+                eph = planetsGHA_at(grid, 24*n+h)
                 line = r'''\color{{blue}}{{{}}} & '''.format(h)
                 line = line + r'''{} && {} & {} && {} & {} && {} & {} && {} & {} \\
 '''.format(eph[0],eph[1],eph[2],eph[3],eph[4],eph[5],eph[6],eph[7],eph[8])
                 if group == 1:
-                    tab = tab + r'''\rowcolor{LightCyan}
+                    tab = tab + r'''\RC
 '''
                 tab = tab + line
                 h += 1
-                da = da + ephem.hour
 
-        vd = vdm_planets(dfloat + n)
+        vd = vdm_planets_at(grid, 24*n)
         tab = tab + r'''\cmidrule{{1-2}} \cmidrule{{4-5}} \cmidrule{{7-8}} \cmidrule{{10-11}} \cmidrule{{13-14}}
 \multicolumn{{2}}{{c}}{{\footnotesize{{Mer.pass. {}}}}} && 
-\multicolumn{{2}}{{c}}{{\footnotesize{{\(\nu\){}$'$ \emph{{d}}{}$'$ m{}\hphantom{{0}}}}}} && 
-\multicolumn{{2}}{{c}}{{\footnotesize{{\(\nu\){}$'$ \emph{{d}}{}$'$ m{}\hphantom{{0}}}}}} && 
-\multicolumn{{2}}{{c}}{{\footnotesize{{\(\nu\){}$'$ \emph{{d}}{}$'$ m{}\hphantom{{0}}}}}} && 
-\multicolumn{{2}}{{c}}{{\footnotesize{{\(\nu\){}$'$ \emph{{d}}{}$'$ m{}\hphantom{{0}}}}}}\\
+\PLvdm{{{}}}{{{}}}{{{}}} && \PLvdm{{{}}}{{{}}}{{{}}} && \PLvdm{{{}}}{{{}}}{{{}}} && \PLvdm{{{}}}{{{}}}{{{}}}\\
 \cmidrule{{1-2}} \cmidrule{{4-5}} \cmidrule{{7-8}} \cmidrule{{10-11}} \cmidrule{{13-14}}
-'''.format(ariestransit(dfloat + n),vd[0],vd[1],vd[2],vd[3],vd[4],vd[5],vd[6],vd[7],vd[8],vd[9],vd[10],vd[11])
+'''.format(aries_at(data, n),vd[0],vd[1],vd[2],vd[3],vd[4],vd[5],vd[6],vd[7],vd[8],vd[9],vd[10],vd[11])
         # the phantom character '0' compensates the format with two decimal places in SFalmanac
         if n < 2:
             vsep = ""
@@ -368,9 +388,10 @@ def planetstabm(dfloat):
     return tab
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def starstab(dfloat):
+def starstab(data):
     # returns a table with ephemerides for the navigational stars
     # OLD: \begin{tabular*}{0.25\textwidth}[t]{@{\extracolsep{\fill}}|rrr|}
+    dfloat = data.date
 
     if config.tbls == "m":
         out = r'''\renewcommand{\arraystretch}{1.1}
@@ -390,7 +411,7 @@ def starstab(dfloat):
 \rule{0pt}{2.4ex} & \multicolumn{1}{c}{\textbf{SHA}} & \multicolumn{1}{c|}{\textbf{Dec}}\\
 \hline\rule{0pt}{2.6ex}\noindent
 '''
-    stars = stellar(dfloat+1)
+    stars = data.stars
     for i in range(len(stars)):
         out = out + r'''{} & {} & {} \\
 '''.format(stars[i][0],stars[i][1],stars[i][2])
@@ -413,8 +434,7 @@ def starstab(dfloat):
             m = m + r'''& & \multicolumn{{1}}{{r|}}{{}}\\[-2.0ex]
 \textbf{{{}}} & \textbf{{SHA}} & \textbf{{Mer.pass}}\\
 '''.format(datestr)
-        datex = ephem.date(dfloat + i)
-        p = planetstransit(datex)
+        p = planets_at(data, i)
         m = m + r'''Venus & {} & {} \\
 '''.format(p[0],p[1])
         m = m + r'''Mars & {} & {} \\
@@ -445,12 +465,13 @@ def starstab(dfloat):
     return out
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def sunmoontab(dfloat):
+def sunmoontab(data):
     # generates LaTeX table for sun and moon (traditional style)
     # OLD: \begin{tabular*}{0.54\textwidth}[t]{@{\extracolsep{\fill}}|c|rr|rrrrr|}
     # OLD note: 54% table width above removes "Overfull \hbox (1.65279pt too wide)"
     #                 and "Underfull \hbox (badness 10000)"
     # OLD: \begin{tabular}[t]{|C{15pt}|rr|rR{18pt}rR{18pt}r|}
+    dfloat = data.date
 
     # note: table may have different widths due to the 1st column (e.g. Fri versus Wed)
     # note: table may have different widths due to the 'v' column (e.g. 6.9' versus 15.3')
@@ -461,12 +482,11 @@ def sunmoontab(dfloat):
 \begin{tabular}[t]{|c|rr|rrrrr|}
 \multicolumn{1}{c}{\normalsize{h}}& \multicolumn{2}{c}{\normalsize{Sun}} & \multicolumn{5}{c}{\normalsize{Moon}}\\
 '''
+    grid = data.grid
     n = 0
     while n < 3:
         da = dfloat + n
-        tab = tab + r'''\hline
-\multicolumn{{1}}{{|c|}}{{\rule{{0pt}}{{2.6ex}}\textbf{{{}}}}} &\multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c|}}{{\textbf{{Dec}}}}  & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\(\nu\)}} & \multicolumn{{1}}{{c}}{{\textbf{{Dec}}}} & \multicolumn{{1}}{{c}}{{\textit{{d}}}} & \multicolumn{{1}}{{c|}}{{\textbf{{HP}}}}\\
-\hline\rule{{0pt}}{{2.6ex}}\noindent
+        tab = tab + r'''\SMhead{{{}}}\rule{{0pt}}{{2.6ex}}\noindent
 '''.format(ephem.date(da).datetime().strftime("%a"))
         h = 0
 
@@ -474,11 +494,9 @@ def sunmoontab(dfloat):
             # first populate an array of 24 hours with all data
             hourlydata = [[] for i in range(24)]
             while h < 24:
-                hourlydata[h] = sunmoon(da)
-                da = da + ephem.hour
+                hourlydata[h] = sunmoon_at(grid, 24*n+h)
                 h += 1
             # now print the data per hour
-            da = dfloat + n
             h = 0
             mlastNS = ''
             while h < 24:
@@ -505,26 +523,24 @@ def sunmoontab(dfloat):
                 lineterminator = r'''\\
 '''
                 if h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab = tab + line + lineterminator
                 h += 1
-                da = da + ephem.hour
 
         else:			# Positive/Negative Declinations
             while h < 24:
-                eph = sunmoon(da)
+                eph = sunmoon_at(grid, 24*n+h)
                 line = r'''{} & {} & {} & {} & {} & {} & {} & {}'''.format(h,eph[0],eph[1],eph[2],eph[3],eph[4],eph[5],eph[6])
                 lineterminator = r'''\\
 '''
                 if h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab = tab + line + lineterminator
                 h += 1
-                da = da + ephem.hour
 
-        vd = sun_moon_SD(dfloat + n)
+        vd = sun_moon_SD_at(grid, 24*n)
         tab = tab + r'''\hline
 \rule{{0pt}}{{2.4ex}} & \multicolumn{{1}}{{c}}{{SD = {}$'$}} & \multicolumn{{1}}{{c|}}{{\textit{{d}} = {}$'$}} & \multicolumn{{5}}{{c|}}{{SD = {}$'$}}\\
 \hline
@@ -538,8 +554,9 @@ def sunmoontab(dfloat):
     return tab
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def sunmoontabm(dfloat):
+def sunmoontabm(data):
     # generates LaTeX table for sun and moon (modern style)
+    dfloat = data.date
 
     tab = r'''\noindent
 \renewcommand{\arraystretch}{1.1}
@@ -551,11 +568,12 @@ def sunmoontabm(dfloat):
 \multicolumn{5}{c}{\normalsize{Moon}}\\
 \cmidrule{2-3} \cmidrule{5-9}'''
     # note: \quad\quad above shifts all tables to the right (still within margins)
+    grid = data.grid
     n = 0
     while n < 3:
         da = dfloat + n
         tab = tab + r'''
-\multicolumn{{1}}{{c}}{{\textbf{{{}}}}} & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\textbf{{Dec}}}} & & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c}}{{\textbf{{\(\nu\)}}}} & \multicolumn{{1}}{{c}}{{\textbf{{Dec}}}} & \multicolumn{{1}}{{c}}{{\textit{{d}}}} & \multicolumn{{1}}{{c}}{{\textbf{{HP}}}}\\
+\SMhead{{{}}}
 '''.format(ephem.date(da).datetime().strftime("%a"))
         h = 0
 
@@ -563,11 +581,9 @@ def sunmoontabm(dfloat):
             # first populate an array of 24 hours with all data
             hourlydata = [[] for i in range(24)]
             while h < 24:
-                hourlydata[h] = sunmoon(da)
-                da = da + ephem.hour
+                hourlydata[h] = sunmoon_at(grid, 24*n+h)
                 h += 1
             # now print the data per hour
-            da = dfloat + n
             h = 0
             mlastNS = ''
             while h < 24:
@@ -597,28 +613,26 @@ def sunmoontabm(dfloat):
 '''.format(eph[0],sdec,eph[2],eph[3],mdec,eph[5],eph[6])
 
                 if group == 1:
-                    tab = tab + r'''\rowcolor{LightCyan}
+                    tab = tab + r'''\RC
 '''
                 tab = tab + line
                 h += 1
-                da = da + ephem.hour
 
         else:			# Positive/Negative Declinations
             while h < 24:
-                eph = sunmoon(da)
+                eph = sunmoon_at(grid, 24*n+h)
                 band = int(h/6)
                 group = band % 2
                 line = r'''\color{{blue}}{{{}}} & '''.format(h)
                 line = line + r'''{} & {} && {} & {} & {} & {} & {} \\
 '''.format(eph[0],eph[1],eph[2],eph[3],eph[4],eph[5],eph[6])
                 if group == 1:
-                    tab = tab + r'''\rowcolor{LightCyan}
+                    tab = tab + r'''\RC
 '''
                 tab = tab + line
                 h += 1
-                da = da + ephem.hour
 
-        vd = sun_moon_SD(dfloat + n)
+        vd = sun_moon_SD_at(grid, 24*n)
         tab = tab + r'''\cmidrule{{2-3}} \cmidrule{{5-9}}
 \multicolumn{{1}}{{c}}{{}} & \multicolumn{{1}}{{c}}{{\footnotesize{{SD = {}$'$}}}} & 
 \multicolumn{{1}}{{c}}{{\footnotesize{{\textit{{d}} = {}$'$}}}} && \multicolumn{{5}}{{c}}{{\footnotesize{{SD = {}$'$}}}}\\
@@ -636,8 +650,9 @@ def sunmoontabm(dfloat):
     return tab
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def twilighttab(dfloat):
+def twilighttab(data):
     # returns the twilight and moonrise tables, finally EoT data
+    dfloat = data.date
 
 # Twilight tables ...........................................
     #lat = [72,70,68,66,64,62,60,58,56,54,52,50,45,40,35,30,20,10,0, -10,-20,-30,-35,-40,-45,-50,-52,-54,-56,-58,-60]
@@ -688,7 +703,7 @@ def twilighttab(dfloat):
 '''
     lasthemisph = ""
     j = 5
-    for i in config.lat:
+    for n, i in enumerate(data.lats):
         if i >= 0:
             hemisph = 'N'
         else:
@@ -701,8 +716,8 @@ def twilighttab(dfloat):
                 tab = tab + r'''\rule{0pt}{2.6ex}
 '''
         lasthemisph = hemisph
-        # day+1 to calculate for the second day (three days are printed on one page)
-        twi = twilight(dfloat+1, i, hemisph)
+        # day+1 for the second day (three days are printed on one page)
+        twi = twilight_at(data, 1, n)
         line = r'''\textbf{{{}}}'''.format(hsph) + " " + r'''{}$^\circ$'''.format(abs(i))
         line = line + r''' & {} & {} & {} & {} & {} & {} \\
 '''.format(twi[0],twi[1],twi[2],twi[4],twi[5],twi[6])
@@ -742,7 +757,7 @@ def twilighttab(dfloat):
     moon2 = [0,0,0,0,0,0]
     lasthemisph = ""
     j = 5
-    for i in config.lat:
+    for n, i in enumerate(data.lats):
         if i >= 0:
             hemisph = 'N'
         else:
@@ -755,7 +770,8 @@ def twilighttab(dfloat):
                 tab = tab + r'''\rule{0pt}{2.6ex}
 '''
         lasthemisph = hemisph
-        moon, moon2 = moonrise_set(dfloat,i)
+        for k in range(3):
+            moon[k], moon[k+3], moon2[k], moon2[k+3] = moon_at(data, k, n)
         if not(double_events_found(moon,moon2)):
             tab = tab + r'''\textbf{{{}}}'''.format(hsph) + " " + r'''{}$^\circ$'''.format(abs(i))
             tab = tab + r''' & {} & {} & {} & {} & {} & {} \\
@@ -814,8 +830,8 @@ def twilighttab(dfloat):
 '''
 
     for k in range(3):
-        d = ephem.date(dfloat+k)
-        eq = equation_of_time(d)
+        d = data.day[k].date
+        eq = equation_at(data, k)
         if k == 2:
             tab = tab + r'''{} & {} & {} & {} & {} & {} & {}({}\%) \\[0.3ex]
 '''.format(d.datetime().strftime("%d"),eq[0],eq[1],eq[2],eq[3],eq[4],eq[5],eq[6])
@@ -830,9 +846,20 @@ def twilighttab(dfloat):
 #   page preparation
 #----------------------
 
-def doublepage(first_day, page1):
+def doublepagedata(first_day, page1):
+    # returns all data of a doublepage (twilight and sunrise/sunset only for the second day)
+    # and the star positions (for the second day)
+    dfloat = ephem.Date(r'''{}/{}/{}'''.format(first_day.year,first_day.month,first_day.day))
+    data = almanacdata(dfloat, 3, False, gridbodies, True, [1])
+    data.stars = stellar(dfloat+1)
+    return data
+
+def doublepage(first_day, page1, data = None):
     # creates a doublepage (3 days) of the nautical almanac
+    # data = the data of the doublepage (see doublepagedata) if already computed
 
+    if data is None:
+        data = doublepagedata(first_day, page1)
     first_day = r'''{}/{}/{}'''.format(first_day.year,first_day.month,first_day.day)
     dfloat = ephem.Date(first_day)      # convert date to float
     page = ''
@@ -888,11 +915,11 @@ def doublepage(first_day, page1):
 # ...........................................................
 
     if config.tbls == "m":
-        page += planetstabm(dfloat)
+        page += planetstabm(data)
     else:
-        page += planetstab(dfloat) + r'''\enskip
+        page += planetstab(data) + r'''\enskip
 '''
-    page += starstab(dfloat)
+    page += starstab(data)
     # print date based on dfloat (as Ephem routines use dfloat)
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
     if config.FANCYhd:
@@ -924,21 +951,29 @@ def doublepage(first_day, page1):
     page += str1
 
     if config.tbls == "m":
-        page += sunmoontabm(dfloat)
+        page += sunmoontabm(data)
     else:
-        page += sunmoontab(dfloat) + r'''\enskip
+        page += sunmoontab(data) + r'''\enskip
 '''
-    page += twilighttab(dfloat)
+    page += twilighttab(data)
     # to avoid "Overfull \hbox" messages, leave a paragraph end before the end of a size change. (This may only apply to tabular* table style) See lines below...
     page += r'''
 \end{scriptsize}'''
     return page
 
 
+# page layout globals (set by makeNAnew or makeNAold) required by doublepage
+pagevars = ['tm', 'bm', 'oddtm', 'oddbm', 'oddim', 'oddom', 'oddhs', 'oddfs',
+            'eventm', 'evenbm', 'evenim', 'evenom', 'evenhs', 'evenfs']
+
+def pageglobals():
+    # returns the page layout globals (for worker processes)
+    return {key: value for key, value in globals().items() if key in pagevars}
+
 def pages(first_day, dtp):
     # dtp = 0 if for entire year; = -1 if for entire month; else days to print
 
-    out = ''
+    args = []       # page arguments in date order
     page1 = True
     dpp = 3         # 3 days per page
     day1 = first_day
@@ -948,7 +983,7 @@ def pages(first_day, dtp):
         yr = year
         while year == yr:
             day3 = day1 + timedelta(days=2)
-            out += doublepage(day1, page1)
+            args.append((day1, page1))
             page1 = False
             day1 += timedelta(days=3)
             year = day1.year
@@ -957,19 +992,19 @@ def pages(first_day, dtp):
         m = mth
         while mth == m:
             day3 = day1 + timedelta(days=2)
-            out += doublepage(day1, page1)
+            args.append((day1, page1))
             page1 = False
             day1 += timedelta(days=3)
             mth = day1.month
     else:           # print 'dtp' days beginning with first_day
         i = dtp   # don't decrement dtp
         while i > 0:
-            out += doublepage(day1, page1)
+            args.append((day1, page1))
             page1 = False
             i -= 3
             day1 += timedelta(days=3)
 
-    return out
+    return pagemap(doublepage, args, pageglobals(), doublepagedata)
 
 #--------------------------
 #   external entry point
@@ -977,6 +1012,7 @@ def pages(first_day, dtp):
 
 def almanac(first_day, dtp):
     # make almanac starting from first_day
+    # returns a generator of LaTeX fragments (the preamble, then page by page)
     # dtp = 0 if for entire year; = -1 if for entire month; else days to print
 
     if config.FANCYhd:
@@ -1200,7 +1236,9 @@ def makeNAnew(first_day, dtp):
 %\showboxbreadth=50  % use for logging
 %\showboxdepth=50    % use for logging
 %\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}
-\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py
+\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py'''
+    tex += texmacros()
+    tex += r'''
 \begin{document}'''
 
     if not config.DPonly:
@@ -1211,10 +1249,10 @@ def makeNAnew(first_day, dtp):
 \pagestyle{datapage}  % the default page style for the document
 \setcounter{page}{2}'''
 
-    tex += pages(first_day,dtp)
-    tex += r'''
+    yield tex
+    yield from pages(first_day,dtp)
+    yield r'''
 \end{document}'''
-    return tex
 
 # ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===
 # ===   ===   ===   ===   O L D   F O R M A T T I N G   ===   ===   ===   ===
@@ -1388,7 +1426,9 @@ def makeNAold(first_day, dtp):
 %\showboxbreadth=50  % use for logging
 %\showboxdepth=50    % use for logging
 %\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}
-\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py
+\setlength\fboxsep{1.5pt}       % ONLY used by \colorbox in alma_ephem.py'''
+    tex += texmacros()
+    tex += r'''
 \begin{document}'''
 
     if not config.DPonly:
@@ -1398,7 +1438,7 @@ def makeNAold(first_day, dtp):
     tex += r'''
 \setcounter{page}{2}'''
 
-    tex += pages(first_day,dtp)
-    tex += r'''
-\end{document}'''
-    return tex
\ No newline at end of file
+    yield tex
+    yield from pages(first_day,dtp)
+    yield r'''
+\end{document}'''
\ No newline at end of file
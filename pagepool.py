@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#   Copyright (C) 2022  Andrew Bauer
+
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# NOTE: the pages of a range are spread over 'config.jobs' worker processes.
+#       Each worker is given one contiguous run of pages (in date order) and the
+#       results are yielded in date order, as soon as the preceding pages are done.
+#       The workers receive the settings in config.py that the page functions
+#       depend on, and the module globals of the page function (e.g. page margins),
+#       so that this also works where processes are spawned (Windows and macOS).
+
+###### Standard library imports ######
+import hashlib
+import importlib
+import multiprocessing as mp
+import os
+import queue
+import threading
+
+###### Third party imports ######
+import ephem
+
+###### Local application imports ######
+import config
+
+# config.py settings that a page depends upon
+configvars = ['pgsz', 'chebyshev', 'WINpf', 'LINUXpf', 'MACOSpf', 'FANCYhd',
+              'DPonly', 'tbls', 'decf', 'lat']
+# further settings for the worker processes (they do not change a page)
+workervars = configvars + ['ephemstore', 'storedir']
+
+# NOTE: with config.lookahead > 0 (and one process) a page function can be split
+#       into a compute function, which returns the data of a page, and the page
+#       function, which renders the data as TeX. A thread then computes the data of
+#       up to config.lookahead pages ahead while the pages are rendered and written.
+
+# NOTE: with config.pagecache the rendered pages are also kept on disk in
+#       config.cachedir, one file per page named by a hash of everything the page
+#       depends on: the page function and its arguments, the settings above, the
+#       page module globals and a stamp of the program code and Ephem version.
+#       Pages found in the cache are read instead of being generated. When the
+#       cache exceeds config.cachemax MB the least recently used pages are removed;
+#       such a page is generated and cached again when it is next required. So
+#       'cachemax' should hold all pages that are created repeatedly, otherwise
+#       each run removes the pages the next run requires first.
+
+#----------------------
+#   internal methods
+#----------------------
+
+def initworker(settings, module, pageglobals):
+    # copy the main process settings into a worker process
+    for key, value in settings.items():
+        setattr(config, key, value)
+    vars(importlib.import_module(module)).update(pageglobals)
+    return
+
+def runpage(task):
+    # generate one page in a worker process
+    page, args = task
+    return page(*args)
+
+def pipeline(compute, page, args):
+    # yields page(*a, compute(*a)) for each tuple 'a' in 'args'; a thread computes
+    # the data of up to config.lookahead pages ahead (the queue blocks it beyond that)
+    q = queue.Queue(config.lookahead)
+    stop = threading.Event()
+
+    def producer():
+        for a in args:
+            try:
+                item = (compute(*a), None)
+            except Exception as e:
+                item = (None, e)
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if stop.is_set() or item[1] is not None:
+                return
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        for a in args:
+            data, error = q.get()
+            if error is not None:
+                raise error
+            yield page(*a, data)
+    finally:
+        stop.set()      # when the pages are not all consumed
+        thread.join()
+    return
+
+def renderpages(page, args, pageglobals, compute = None):
+    # yields page(*a) for each tuple 'a' in 'args' (in config.jobs processes)
+    # compute = function returning the data of page(*a) for the pipeline (see NOTE above)
+
+    jobs = min(config.jobs, len(args))
+    if jobs <= 1:
+        if compute is not None and config.lookahead > 0 and len(args) > 1:
+            yield from pipeline(compute, page, args)
+            return
+        for a in args:
+            yield page(*a)
+        return
+
+    settings = {key: getattr(config, key) for key in workervars}
+    chunk = -(-len(args) // jobs)       # one contiguous run of pages per worker
+    with mp.Pool(jobs, initworker, (settings, page.__module__, pageglobals)) as pool:
+        for tex in pool.imap(runpage, [(page, a) for a in args], chunk):
+            yield tex
+    return
+
+#----------------------
+#   page cache
+#----------------------
+
+codestamps = {}     # code stamp per page module
+
+def codestamp(module):
+    # returns a hash of the program code a page of 'module' depends upon
+    if module not in codestamps:
+        h = hashlib.sha256(ephem.__version__.encode())
+        for name in [module, 'alma_ephem', 'almadata', __name__]:
+            with open(importlib.import_module(name).__file__, 'rb') as f:
+                h.update(f.read())
+        codestamps[module] = h.hexdigest()
+    return codestamps[module]
+
+def pagekey(page, a, pageglobals):
+    # returns the cache filename of page(*a)
+    settings = [(key, getattr(config, key)) for key in configvars]
+    text = repr((codestamp(page.__module__), page.__module__, page.__name__, a,
+                 settings, sorted(pageglobals.items())))
+    return os.path.join(config.docker_prefix + config.cachedir,
+                        hashlib.sha256(text.encode()).hexdigest() + ".tex")
+
+def readcache(fn):
+    # returns a cached page (None if it is not in the cache)
+    try:
+        with open(fn, mode="r", encoding="utf8") as f:
+            tex = f.read()
+        os.utime(fn)        # the modification time orders the pages by last use
+    except OSError:
+        return None
+    return tex
+
+def writecache(fn, tex):
+    # stores a page in the cache (the rename ensures no partial page is ever read)
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    tmp = "{}.{}".format(fn, os.getpid())
+    with open(tmp, mode="w", encoding="utf8") as f:
+        f.write(tex)
+    os.replace(tmp, fn)
+    return
+
+def trimcache():
+    # removes the least recently used pages while the cache exceeds config.cachemax MB
+    folder = config.docker_prefix + config.cachedir
+    try:
+        files = [e for e in os.scandir(folder) if e.name.endswith(".tex")]
+    except OSError:
+        return
+    files = sorted(files, key=lambda e: e.stat().st_mtime)
+    size = sum(e.stat().st_size for e in files)
+    while files and size > config.cachemax * 1024 * 1024:
+        e = files.pop(0)
+        size -= e.stat().st_size
+        try:
+            os.remove(e.path)
+        except OSError:
+            pass
+    return
+
+#--------------------------
+#   external entry point
+#--------------------------
+
+def pagemap(page, args, pageglobals = {}, compute = None):
+    # yields page(*a) for each tuple 'a' in 'args' in the given order
+    # pageglobals = module globals (of the module containing 'page') required by 'page'
+    # compute     = function returning the data of page(*a), which page(*a, data) renders
+    #               (optional; the data is then computed ahead in a pipeline)
+
+    if not config.pagecache:
+        yield from renderpages(page, args, pageglobals, compute)
+        return
+
+    keys = [pagekey(page, a, pageglobals) for a in args]
+    hits = set(key for key in keys if os.path.isfile(key))
+    rendered = renderpages(page, [a for a, key in zip(args, keys) if key not in hits], pageglobals, compute)
+    for a, key in zip(args, keys):
+        if key in hits:
+            tex = readcache(key)
+            if tex is None:             # removed in the meantime (by trimcache)
+                tex = page(*a)
+                writecache(key, tex)
+        else:
+            tex = next(rendered)
+            writecache(key, tex)
+        yield tex
+    trimcache()
+    return
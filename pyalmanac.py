@@ -19,8 +19,16 @@
 #     51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 ###### Standard library imports ######
+import hashlib
+import json
+import multiprocessing as mp
 import os
+import queue
+import re
+import shutil
+import subprocess
 import sys
+import threading
 import time
 from datetime import date, datetime, timedelta
 
@@ -35,6 +43,8 @@ import nautical
 import suntables
 import eventtables
 import increments
+import alma_ephem
+import dataexport
 
 
 def toUnix(fn):
@@ -43,22 +53,39 @@ def toUnix(fn):
     return fn
 
 def deletePDF(filename):
+    # a PDF file with a TeX hash (see below) is kept until its TeX is known to have changed
+    if not os.path.exists(filename + ".texhash"):
+        removePDF(filename)
+    if os.path.exists(filename + ".tex"):
+        os.remove(filename + ".tex")
+
+def removePDF(filename):
     if os.path.exists(filename + ".pdf"):
         try:
             os.remove(filename + ".pdf")
         except PermissionError:
             print("ERROR: please close '{}' so it can be re-created".format(filename + ".pdf"))
             sys.exit(0)
-    if os.path.exists(filename + ".tex"):
-        os.remove(filename + ".tex")
+    if os.path.exists(filename + ".texhash"):
+        os.remove(filename + ".texhash")
 
 def makePDF(pdfcmd, fn, msg = ""):
-    command = 'pdflatex {}'.format(pdfcmd + fn + ".tex")
+    digest = texdigest(fn)
+    if unchanged(fn, digest):
+        print("'{}' is unchanged".format(fn + ".pdf"))
+        return
+    removePDF(fn)
+    command = 'pdflatex {}'.format(texformat(pdfcmd, fn) + pdfcmd + fn + ".tex")
+    returned_value = os.system(command)
+    reportPDF(pdfcmd, fn, returned_value, msg)
+    if returned_value == 0:
+        savedigest(fn, digest)
+    return
+
+def reportPDF(pdfcmd, fn, returned_value, msg = ""):
     if pdfcmd == "":
-        os.system(command)
         print("finished" + msg)
     else:
-        returned_value = os.system(command)
         if returned_value != 0:
             if msg != "":
                 print("ERROR detected while" + msg)
@@ -72,6 +99,590 @@ def makePDF(pdfcmd, fn, msg = ""):
                 print("finished creating '{}'".format(fn + ".pdf"))
     return
 
+#-----------------------------
+#   unchanged PDF files
+#-----------------------------
+
+# After a successful pdflatex run the hash of the TeX file (and of its chunk
+# documents, see splitTeX) together with the TeX version is saved in 'fn.texhash'.
+# When the same TeX is created again with the same TeX installation, the PDF file
+# is kept as it is and pdflatex is not run. The generators put no run-time data
+# into the TeX files (the date on the title page is '\today' of the pdflatex run).
+
+def texdigest(fn, parts = []):
+    # returns the hash of 'fn'.tex, the TeX files of 'parts' and the TeX version
+    h = hashlib.sha256(config.texversion.encode("utf8"))
+    for f in [fn] + parts:
+        with open(f + ".tex", mode="rb") as tex:
+            for block in iter(lambda: tex.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+def unchanged(fn, digest):
+    # True if 'fn'.pdf exists and was made from TeX with the hash 'digest'
+    if not (os.path.isfile(fn + ".pdf") and os.path.isfile(fn + ".texhash")):
+        return False
+    with open(fn + ".texhash", mode="r", encoding="utf8") as f:
+        return f.read().strip() == digest
+
+def savedigest(fn, digest):
+    with open(fn + ".texhash", mode="w", encoding="utf8") as f:
+        f.write(digest + "\n")
+
+#-----------------------------
+#   static products
+#-----------------------------
+
+# The "Increments and Corrections" tables do not depend on the date. With
+# 'staticcache' in config.py a created PDF file is kept in 'cachedir' under a name
+# that includes a hash of everything it depends on: increments.py, the config.py
+# settings in 'staticvars' and the TeX version. Later runs copy it instead of
+# creating the TeX and running pdflatex. (The star chart on the title pages is a
+# PDF file already.) 'staticfile' resolves the cache folder against the current
+# working folder, so it must be called before a Docker run changes into 'docker_pdf'.
+
+staticvars = ['pgsz']       # config.py settings read by increments.makelatex()
+
+def staticfile(fn):
+    # returns the (absolute) cache filename of the static product 'fn'.pdf
+    with open(increments.__file__, mode="rb") as f:
+        h = hashlib.sha256(f.read())
+    settings = [(key, getattr(config, key)) for key in staticvars]
+    h.update(repr((settings, config.texversion)).encode("utf8"))
+    key = h.hexdigest()[:16]
+    return os.path.abspath(os.path.join(config.docker_prefix + config.cachedir, "{}-{}.pdf".format(fn, key)))
+
+def getstatic(fn, kt, cached):
+    # copies the cached 'fn'.pdf (at path 'cached', see staticfile) to the output folder;
+    # False if not cached (or the TeX is to be kept)
+    if kt or not config.staticcache or not os.path.isfile(cached):
+        return False
+    removePDF(config.docker_prefix + fn)
+    if os.path.exists(config.docker_prefix + fn + ".tex"):
+        os.remove(config.docker_prefix + fn + ".tex")
+    shutil.copyfile(cached, config.docker_prefix + fn + ".pdf")
+    print("copied '{}' from the cache of static products".format(fn + ".pdf"))
+    return True
+
+def putstatic(fn, pdf, cached):
+    # keeps the created 'fn'.pdf (at path 'pdf') in the cache at path 'cached' (see
+    # staticfile), replacing previous versions
+    if not config.staticcache or not os.path.isfile(pdf) or os.path.isfile(cached):
+        return
+    folder = os.path.dirname(cached)
+    os.makedirs(folder, exist_ok=True)
+    for f in os.listdir(folder):
+        if f.startswith(fn + "-") and f.endswith(".pdf"):
+            os.remove(os.path.join(folder, f))
+    tmp = "{}.{}".format(cached, os.getpid())
+    shutil.copyfile(pdf, tmp)
+    os.replace(tmp, cached)     # no partial PDF file is ever copied
+    return
+
+#-----------------------------
+#   precompiled TeX formats
+#-----------------------------
+
+# With '-fmt' the preamble of a document (everything before \begin{document}) is
+# dumped into a format file 'almanac-<hash>.fmt' next to the PDF files by the
+# 'mylatexformat' package, and pdflatex loads the format instead of reading babel,
+# geometry, fancyhdr, xcolor, multirow, graphicx and TikZ again. There is one format
+# per preamble variant, i.e. per product, table style, paper size and header style.
+# All formats are removed (and rebuilt when needed) if 'tex --version' reports
+# another TeX installation than the one that made them (see 'almanac-fmt.ver').
+
+def texpreamble(fn):
+    # returns the preamble of the TeX file 'fn' (up to \begin{document})
+    preamble = ""
+    with open(fn, mode="r", encoding="utf8") as f:
+        for line in f:
+            if line.startswith(r'\begin{document}'):
+                break
+            preamble += line
+    return preamble
+
+def texformat(pdfcmd, fn, folder = ""):
+    # returns the pdflatex option that loads the format for the preamble of 'fn'.tex,
+    # which is created first if required; "" without '-fmt' or if it cannot be created
+    # folder = the folder of 'fn'.tex, where pdflatex runs (relative to the working folder)
+    if not config.texfmt:
+        return ""
+    ver = folder + "almanac-fmt.ver"
+    texver = ""
+    if os.path.isfile(ver):
+        with open(ver, mode="r", encoding="utf8") as f:
+            texver = f.read()
+    if texver != config.texversion:     # another TeX installation: discard all formats
+        for f in os.listdir(folder if folder != "" else "."):
+            if f.startswith("almanac-") and f.endswith(".fmt"):
+                os.remove(folder + f)
+        with open(ver, mode="w", encoding="utf8") as f:
+            f.write(config.texversion)
+
+    preamble = texpreamble(folder + fn + ".tex")
+    name = "almanac-" + hashlib.sha1(preamble.encode("utf8")).hexdigest()[:12]
+    if not os.path.isfile(folder + name + ".fmt"):
+        command = 'pdflatex -ini {}-jobname={} "&pdflatex" mylatexformat.ltx {}'.format(pdfcmd, name, fn + ".tex")
+        returned_value = subprocess.call(command, shell=True, cwd=(folder if folder != "" else None))
+        if os.path.isfile(folder + name + ".log"):
+            os.remove(folder + name + ".log")
+        if returned_value != 0 or not os.path.isfile(folder + name + ".fmt"):
+            print("ERROR: the TeX format could not be created (is 'mylatexformat' installed?)")
+            print("       continuing without '-fmt'")
+            config.texfmt = False
+            return ""
+    return "-fmt={} ".format(name)
+
+#---------------------------
+#   pdflatex scheduler
+#---------------------------
+
+# When a range of years is created, pdflatex compiles a year in the background
+# while the next year is computed. Up to 'config.texjobs' pdflatex processes run
+# at once (0 = as many as the CPU quota permits); in verbose mode ('-v') only one,
+# so that the console output is not interleaved.
+
+pdfjobs = []        # running pdflatex processes: [process, fn, pdfcmd, keeplog, keeptex, parts, digest]
+pdfstatus = {}      # exit status of the finished pdflatex processes per file
+
+def cpuquota():
+    # returns the number of CPUs this process may use, honouring a cgroup CPU quota (e.g. Docker '--cpus')
+    try:
+        ncpu = len(os.sched_getaffinity(0))
+    except AttributeError:
+        ncpu = os.cpu_count() or 1
+    quota = -1
+    period = 0
+    try:
+        if os.path.exists("/sys/fs/cgroup/cpu.max"):        # cgroup v2
+            with open("/sys/fs/cgroup/cpu.max") as f:
+                q, p = f.read().split()[:2]
+            if q != "max":
+                quota, period = int(q), int(p)
+        elif os.path.exists("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"):   # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+    except (OSError, ValueError):
+        quota = -1
+    if quota > 0 and period > 0:
+        ncpu = min(ncpu, max(1, quota // period))
+    return ncpu
+
+def startPDF(pdfcmd, fn, kl, kt, parts = [], record = True):
+    # start pdflatex on 'fn'.tex without waiting for it to finish
+    # parts = chunk documents (see mergeTeX) whose TeX and PDF files are removed afterwards
+    # record = False: always compile and save no TeX hash (for the chunk documents)
+    prefix = config.docker_prefix
+    digest = ""
+    if record:
+        digest = texdigest(prefix + fn, [prefix + part for part in parts])
+        if unchanged(prefix + fn, digest):
+            print("'{}' is unchanged".format(fn + ".pdf"))
+            tidy_up(prefix + fn, kl, kt)
+            tidy_parts(parts, kt, False)
+            return
+        removePDF(prefix + fn)
+    pdfstatus.pop(fn, None)
+    limit = config.texjobs if config.texjobs > 0 else cpuquota()
+    if pdfcmd == "": limit = 1
+    while len(pdfjobs) >= limit:
+        finishPDF(pdfjobs[0])
+    command = 'pdflatex {}'.format(texformat(pdfcmd, fn, prefix) + pdfcmd + fn + ".tex")
+    process = subprocess.Popen(command, shell=True, cwd=(prefix if prefix != "" else None))
+    pdfjobs.append([process, fn, pdfcmd, kl, kt, parts, digest])
+    return
+
+def finishPDF(job):
+    # wait for a pdflatex process, report the result and tidy up
+    process, fn, pdfcmd, kl, kt, parts, digest = job
+    returned_value = process.wait()
+    pdfjobs.remove(job)
+    pdfstatus[fn] = returned_value
+    reportPDF(pdfcmd, fn, returned_value)
+    if returned_value == 0 and digest != "":
+        savedigest(config.docker_prefix + fn, digest)
+    tidy_up(config.docker_prefix + fn, kl, kt)
+    tidy_parts(parts, kt, returned_value == 0)
+    return
+
+def tidy_parts(parts, kt, merged):
+    # removes the TeX files (unless 'kt') and, once merged, the PDF files of chunk documents
+    for part in parts:
+        part = config.docker_prefix + part
+        if not kt and os.path.isfile(part + ".tex"):
+            os.remove(part + ".tex")
+        if merged and os.path.isfile(part + ".pdf"):
+            os.remove(part + ".pdf")
+    return
+
+def waitPDF(fns = None):
+    # wait for the pdflatex processes of the files 'fns' (or all) to finish
+    for job in [job for job in pdfjobs if fns is None or job[1] in fns]:
+        finishPDF(job)
+    return
+
+def warmstore(year):
+    # computes the ephemeris data for all tables of 'year' and saves it in the ephemeris store
+    config.ephemstore = False       # compute everything (into the state cache)
+    config.jobs = 1
+    config.pagecache = False
+    alma_ephem.cachesize = float('inf')
+    alma_ephem.risesize = float('inf')
+    first_day = date(year, 1, 1)
+    for tables in [nautical.almanac, suntables.sunalmanac, eventtables.makeEVtables]:
+        for tex in tables(first_day, 0):
+            pass
+    alma_ephem.savestore(year)
+    return
+
+def exportdata(fmt, year):
+    # writes the almanac data of 'year' in the format 'fmt' (no LaTeX; see dataexport.py)
+    first_day = date(year, 1, 1)
+    days = (date(year+1, 1, 1) - first_day).days
+    fn = config.docker_prefix + "almanac_{}".format(year)
+    for f in dataexport.export(first_day, days, fmt, fn):
+        print("Created: {}".format(f))
+    return
+
+#-------------------
+#   TeX writer
+#-------------------
+
+# With '--pipeline N' the pages of a nautical almanac are computed up to N pages
+# ahead in a thread while they are rendered (see pipeline in pagepool.py), and
+# another thread writes the rendered TeX to the file. The queues between the stages
+# hold N items at most, so a faster stage waits for a slower one. With '--split' a
+# year's chunk documents are compiled as soon as each chunk is written (unless the
+# PDF file may be unchanged, see texdigest).
+
+def writeTeX(outfile, fragments):
+    # writes the TeX fragments to 'outfile' (in a thread with '--pipeline N')
+    if config.lookahead <= 0:
+        outfile.writelines(fragments)
+        return
+    q = queue.Queue(config.lookahead)
+    errors = []
+
+    def writer():
+        while True:
+            tex = q.get()
+            if tex is None:
+                return
+            if not errors:      # keep emptying the queue after an error
+                try:
+                    outfile.write(tex)
+                except OSError as e:
+                    errors.append(e)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for tex in fragments:
+            if errors:
+                break
+            q.put(tex)
+    finally:
+        q.put(None)
+        thread.join()
+    if errors:
+        raise errors[0]
+    return
+
+#-------------------------------
+#   split-and-merge of a year
+#-------------------------------
+
+# With '--split N' the nautical almanac for a year is written as chunk documents
+# of N double pages each, which pdflatex compiles concurrently. The first chunk
+# contains the title pages; the others have the same preamble (as with '-dpo') and
+# continue the page numbering. A document that includes the chunks with the
+# 'pdfpages' package then merges them into the PDF file.
+
+def datapreamble(almanac, first_day, dtp):
+    # returns the preamble of a document without the title pages
+    dponly = config.DPonly
+    config.DPonly = True
+    tex = next(iter(almanac(first_day, dtp)))
+    config.DPonly = dponly
+    return tex
+
+def splitTeX(fragments, dppreamble, fn, size, written = None):
+    # writes the TeX fragments of a nautical almanac as chunk documents of 'size'
+    # double pages (2 pages each); returns the chunk filenames (without extension)
+    # written = function called with each chunk filename once the chunk is complete
+    # Without data pages there is one chunk (with the title pages); no fragments, no chunks.
+    name = re.sub(r'[^\w.-]', '-', fn)     # no TeX special characters in chunk names
+    parts = []
+    pageno = 2          # the first data page is page 2
+    outfile = None
+    fragments = iter(fragments)
+    head = next(fragments, None)
+    if head is None:
+        return parts
+    for tex in fragments:
+        if tex.strip() == r'\end{document}':
+            break
+        if outfile is None or count == size:
+            if outfile is not None:
+                outfile.write(r'''
+\end{document}''')
+                outfile.close()
+                if written is not None: written(parts[-1])
+            parts.append("{}-part{}".format(name, len(parts)+1))
+            outfile = open(config.docker_prefix + parts[-1] + ".tex", mode="w", encoding="utf8")
+            if len(parts) == 1:
+                outfile.write(head)
+            else:
+                outfile.write(dppreamble.replace(r'\setcounter{page}{2}', r'\setcounter{{page}}{{{}}}'.format(pageno)))
+            count = 0
+        outfile.write(tex)
+        count += 1
+        pageno += 2
+    if outfile is None:
+        parts.append("{}-part1".format(name))
+        outfile = open(config.docker_prefix + parts[-1] + ".tex", mode="w", encoding="utf8")
+        outfile.write(head)
+    outfile.write(r'''
+\end{document}''')
+    outfile.close()
+    if written is not None: written(parts[-1])
+    return parts
+
+def startchunk(pdfcmd, kl):
+    # returns a function that starts pdflatex on a chunk document (for splitTeX)
+    return lambda part: startPDF(pdfcmd, part, kl, True, record=False)  # the TeX is hashed with the merged file
+
+def startsplit(pdfcmd, fn, parts, kl, kt, started = False):
+    # compiles the chunk documents 'parts' concurrently and then merges them into 'fn'.pdf
+    # started = True if pdflatex was started on each chunk as it was written (see startchunk)
+    # note: chunks are only started early when 'fn' has no TeX hash (see texdigest), i.e.
+    #       when the PDF file cannot be unchanged; otherwise the chunks are all written
+    #       before the check, which skips compiling them if the PDF file is unchanged.
+    prefix = config.docker_prefix
+    if not parts:
+        print("ERROR: no pages for '{}'".format(fn + ".pdf"))
+        return
+    mergeTeX(fn, parts)
+    if started or not unchanged(prefix + fn, texdigest(prefix + fn, [prefix + part for part in parts])):
+        if not started:
+            for part in parts:
+                startchunk(pdfcmd, kl)(part)
+        waitPDF(parts)
+        failed = [part for part in parts if pdfstatus.get(part) != 0]
+        if failed:
+            print("ERROR: '{}' not created as '{}' failed".format(fn + ".pdf", failed[0] + ".tex"))
+            tidy_up(prefix + fn, kl, kt)
+            tidy_parts(parts, kt, True)
+            return
+    startPDF(pdfcmd, fn, kl, kt, parts)
+    return
+
+def mergeTeX(fn, parts):
+    # writes 'fn'.tex that merges the PDF files of the chunk documents
+    paper = "a4paper" if config.pgsz == "A4" else "letterpaper"
+    outfile = open(config.docker_prefix + fn + ".tex", mode="w", encoding="utf8")
+    outfile.write(r'''\documentclass[{}]{{article}}
+\usepackage{{pdfpages}}
+\begin{{document}}'''.format(paper))
+    for part in parts:
+        outfile.write(r'''
+\includepdf[pages=-,fitpaper]{{{}.pdf}}'''.format(part))
+    outfile.write(r'''
+\end{document}''')
+    outfile.close()
+    return
+
+#-------------------
+#   batch mode
+#-------------------
+
+# With '--batch FILE' the products listed in a JSON (or TOML, with Python 3.11+)
+# manifest are created without any prompts, e.g.
+#   {"jobs": [{"product": "NA", "dates": "2024-2025", "style": "t"},
+#             {"product": "EV", "dates": "2024"},
+#             {"product": "ST", "dates": "01062024", "days": 30, "style": "m+", "paper": "Letter"},
+#             {"product": "INC"}]}
+# product = NA (nautical almanac), ST (sun tables), EV (event time tables) or INC
+# (increments and corrections); dates = 'YYYY', 'YYYY-YYYY', 'DDMMYYYY' (with 'days',
+# default 1), 'MM' or '-MM' as in the interactive mode; style = 't' or 'm' optionally
+# followed by '+' for positive/negative declinations; paper = 'A4' or 'Letter'.
+# Top-level "style" and "paper" entries set the defaults for all jobs.
+# Products whose dates overlap are created one after another in the same process,
+# which keeps the computed body states and sidereal times of the group (up to
+# 'groupcache' times the size of the state cache per product: a year of nautical
+# almanac pages computes about 74,000), so that e.g. the sun tables of a year take
+# the hourly ephemerides of the nautical almanac. The groups are spread
+# over 'config.jobs' processes (--jobs N); pdflatex runs as each product is written.
+
+batchsettings = ['FANCYhd', 'DPonly', 'split', 'lookahead', 'chebyshev', 'pagecache',
+                 'cachedir', 'cachemax', 'ephemstore', 'storedir']
+groupcache = 5      # state cache size per product of a group (in alma_ephem.cachesize)
+
+def readmanifest(fn):
+    # returns the batch manifest in file 'fn' (JSON or TOML)
+    try:
+        if fn.lower().endswith(".toml"):
+            import tomllib
+            with open(fn, mode="rb") as f:
+                return tomllib.load(f)
+        with open(fn, mode="r", encoding="utf8") as f:
+            return json.load(f)
+    except ImportError:
+        print("ERROR: a TOML manifest requires Python 3.11 or later")
+    except (OSError, ValueError) as e:
+        print("ERROR: cannot read the manifest '{}': {}".format(fn, e))
+    sys.exit(0)
+
+def batchdates(ss, days, today):
+    # returns the (first day, days to process, filename date, days spanned) of
+    # the 'dates' entry 'ss' of a manifest job (one per year for 'YYYY-YYYY')
+    if len(ss) == 4 and ss.isnumeric():
+        ss = ss + '-' + ss
+    if len(ss) == 9 and ss[4] == '-' and ss[:4].isnumeric() and ss[5:].isnumeric():
+        check_years(ss[:4], ss[5:])
+        return [(date(y, 1, 1), 0, "{:4d}".format(y), (date(y+1, 1, 1) - date(y, 1, 1)).days)
+                for y in range(int(ss[:4]), int(ss[5:])+1)]
+    if len(ss) in [2,3] and ss[-2:].isnumeric() and (len(ss) == 2 or ss[0] == '-'):
+        mm = ss[-2:]
+        check_mth(mm)
+        yy = today.year
+        if len(ss) == 2 and int(mm) < today.month: yy += 1
+        if len(ss) == 3 and int(mm) >= today.month: yy -= 1
+        first_day = date(yy, int(mm), 1)
+        nextmth = date(yy + int(mm)//12, int(mm)%12 + 1, 1)
+        return [(first_day, -1, first_day.strftime("%Y-%m"), (nextmth - first_day).days)]
+    if len(ss) == 8 and ss.isnumeric():
+        check_date(ss[4:], ss[2:4], ss[:2])
+        first_day = date(int(ss[4:]), int(ss[2:4]), int(ss[:2]))
+    elif ss == "":
+        first_day = today
+    else:
+        print("ERROR: invalid dates in the manifest: '{}'".format(ss))
+        sys.exit(0)
+    if not 1 <= days <= 300:
+        print("ERROR: 'days' not between 1 and 300")
+        sys.exit(0)
+    dto = (first_day + timedelta(days=days-1)).strftime("-%Y%m%d") if days > 1 else ""
+    return [(first_day, days, first_day.strftime("%Y%m%d") + dto, days)]
+
+def planbatch(manifest, today, spdf, forcepgsz = False):
+    # returns the products of a manifest as groups of units with overlapping dates,
+    # a unit being: [product, first day, days to process, filename, tbls, decf, pgsz]
+    # forcepgsz = True if the paper size is given on the command line (config.pgsz)
+    spans = []
+    units = []
+    for job in manifest.get("jobs", []):
+        product = str(job.get("product", "")).upper()
+        if product not in ["NA", "ST", "EV", "INC"]:
+            print("ERROR: invalid product in the manifest: '{}'".format(job.get("product", "")))
+            sys.exit(0)
+        style = job.get("style", manifest.get("style", "t"))
+        tbls = 'm' if style[0:1] == 'm' else ''
+        decf = '+' if style[1:2] == '+' else ''
+        pgsz = config.pgsz if forcepgsz else job.get("paper", manifest.get("paper", config.pgsz))
+        if pgsz not in set(['A4', 'Letter']):
+            print("ERROR: invalid paper size in the manifest: '{}'".format(pgsz))
+            sys.exit(0)
+        if product == "INC":
+            dates = [(None, 0, None, 0)]
+        else:
+            check_exists(spdf + ("Ra.jpg" if product == "ST" else "A4chartNorth_P.pdf"))
+            dates = batchdates(str(job.get("dates", "")), int(job.get("days", 1)), today)
+        for first_day, dtp, dstr, ndays in dates:
+            if product == "INC":
+                fn = toUnix("Inc({})").format(pgsz)
+            elif product == "EV":
+                fn = toUnix("Event-Times({})_{}".format(pgsz,dstr))
+            else:
+                ff = product + ("mod" if tbls == 'm' else "trad")
+                fn = toUnix("{}({})_{}".format(ff,pgsz,dstr + ("[old]" if decf == '+' else "")))
+            if fn in [u[3] for u in units]:
+                continue        # the same product listed twice
+            units.append([product, first_day, dtp, fn, tbls, decf, pgsz])
+            spans.append((first_day or date.min, ndays))
+
+    # group the units whose dates overlap (in date order)
+    groups = []
+    last = date.min
+    for (first_day, ndays), unit in sorted(zip(spans, units), key=lambda x: x[0][0]):
+        if not groups or unit[0] == "INC" or groups[-1][0][0] == "INC" or first_day >= last:
+            groups.append([])
+        groups[-1].append(unit)
+        last = max(last, first_day + timedelta(days=ndays))
+    return groups
+
+def initbatch(settings):
+    # copy the main process settings into a batch worker process
+    for key, value in settings.items():
+        setattr(config, key, value)
+    config.jobs = 1
+    return
+
+def runbatch(group):
+    # writes the TeX files of a group of units; returns [(filename, parts, pgsz)] for pdflatex
+    out = []
+    cachesize = alma_ephem.cachesize
+    alma_ephem.cachesize = groupcache * cachesize * len(group)     # share the ephemerides of the group
+    for product, first_day, dtp, fn, tbls, decf, pgsz in group:
+        config.tbls = tbls
+        config.decf = decf
+        config.pgsz = pgsz
+        start = time.time()
+        parts = []
+        if product == "NA" and dtp == 0 and config.split > 0:
+            parts = splitTeX(nautical.almanac(first_day,0), datapreamble(nautical.almanac,first_day,0), fn, config.split)
+        else:
+            outfile = open(config.docker_prefix + fn + ".tex", mode="w", encoding="utf8")
+            if product == "NA":
+                writeTeX(outfile, nautical.almanac(first_day,dtp))
+            elif product == "ST":
+                outfile.writelines(suntables.sunalmanac(first_day,dtp))
+            elif product == "EV":
+                outfile.writelines(eventtables.makeEVtables(first_day,dtp))
+            else:
+                outfile.write(increments.makelatex())
+            outfile.close()
+        print("created '{}.tex' in {:0.2f} seconds".format(fn, time.time()-start))
+        out.append((fn, parts, pgsz))
+    alma_ephem.statecache.clear()
+    alma_ephem.cachesize = cachesize
+    return out
+
+def batch(manifest, today, spdf, pdfcmd, kl, kt, forcepgsz = False):
+    # creates all products of a manifest (see above)
+    groups = planbatch(manifest, today, spdf, forcepgsz)
+    groups = [g for g in groups if not (g[0][0] == "INC" and getstatic(g[0][3], kt, staticfile(g[0][3])))]
+    for group in groups:
+        for unit in group:
+            deletePDF(config.docker_prefix + unit[3])
+    print("{} products in {} groups".format(sum(len(g) for g in groups), len(groups)))
+
+    jobs = min(config.jobs, len(groups))
+    if jobs <= 1:
+        results = map(runbatch, groups)
+    else:
+        settings = {key: getattr(config, key) for key in batchsettings}
+        pool = mp.Pool(jobs, initbatch, (settings,))
+        results = pool.imap_unordered(runbatch, groups)
+    for out in results:
+        for fn, parts, pgsz in out:
+            config.pgsz = pgsz
+            if parts:
+                startsplit(pdfcmd, fn, parts, kl, kt)
+            else:
+                startPDF(pdfcmd, fn, kl, kt)
+    if jobs > 1:
+        pool.close()
+        pool.join()
+    waitPDF()
+    for group in groups:
+        if group[0][0] == "INC":
+            fn = group[0][3]
+            putstatic(fn, config.docker_prefix + fn + ".pdf", staticfile(fn))
+    return
+
 def tidy_up(fn, kl, kt):
     if not kt: os.remove(fn + ".tex")
     if not kl:
@@ -102,8 +713,10 @@ def check_date(year, month, day):
         print("ERROR: Enter a valid date")
         sys.exit(0)
 
+yrmin = 1000        # valid years
+yrmax = 3000
+
 def check_years(yearfr, yearto):
-    global yrmin, yrmax
 
     if str(yearfr).isnumeric():
         if yrmin <= int(yearfr) <= yrmax:
@@ -136,6 +749,50 @@ if __name__ == '__main__':
         print("This runs only with Python 3")
         sys.exit(0)
 
+    # command line options...
+    if "--jobs" in sys.argv[1:]:    # '--jobs N' is removed once it is valid
+        j = sys.argv.index("--jobs")
+        if j+1 < len(sys.argv) and sys.argv[j+1].isdigit():
+            config.jobs = int(sys.argv[j+1]) if int(sys.argv[j+1]) > 0 else os.cpu_count()
+            del sys.argv[j:j+2]
+    if "--pipeline" in sys.argv[1:]:    # '--pipeline N' is removed once it is valid
+        j = sys.argv.index("--pipeline")
+        if j+1 < len(sys.argv) and sys.argv[j+1].isdigit():
+            config.lookahead = int(sys.argv[j+1])
+            del sys.argv[j:j+2]
+    if "--split" in sys.argv[1:]:   # '--split N' is removed once it is valid
+        j = sys.argv.index("--split")
+        if j+1 < len(sys.argv) and sys.argv[j+1].isdigit():
+            config.split = int(sys.argv[j+1])
+            del sys.argv[j:j+2]
+    batchfile = None
+    if "--batch" in sys.argv[1:]:   # '--batch FILE' is removed once it is given
+        j = sys.argv.index("--batch")
+        if j+1 < len(sys.argv):
+            batchfile = sys.argv[j+1]
+            del sys.argv[j:j+2]
+
+    if "--warm-cache" in sys.argv[1:]:     # fill the ephemeris store for a year and exit
+        j = sys.argv.index("--warm-cache")
+        if j+1 < len(sys.argv) and sys.argv[j+1].isdigit():
+            start = time.time()
+            print("Computing the ephemeris data for the year {}".format(sys.argv[j+1]))
+            warmstore(int(sys.argv[j+1]))
+            print("execution time = {:0.2f} seconds".format(time.time()-start))
+            sys.exit(0)
+
+    if "--export" in sys.argv[1:]:  # export the almanac data of a year (or years) and exit
+        j = sys.argv.index("--export")
+        if j+2 < len(sys.argv) and sys.argv[j+1] in dataexport.formats:
+            yrs = sys.argv[j+2].split('-')
+            if len(yrs) <= 2 and all(len(y) == 4 and y.isdigit() for y in yrs):
+                for yearint in range(int(yrs[0]), int(yrs[-1])+1):
+                    start = time.time()
+                    print("Exporting the almanac data for the year {}".format(yearint))
+                    exportdata(sys.argv[j+1], yearint)
+                    print("execution time = {:0.2f} seconds".format(time.time()-start))
+                sys.exit(0)
+
     # check if TeX Live is compatible with the 'fancyhdr' package...
     process = os.popen("tex --version")
     returned_value = process.read()
@@ -143,6 +800,7 @@ if __name__ == '__main__':
     if returned_value == "":
         print("- - - Neither TeX Live nor MiKTeX is installed - - -")
         sys.exit(0)
+    config.texversion = returned_value.splitlines()[0]
     pos1 = returned_value.find("(") 
     pos2 = returned_value.find(")")
     if pos1 != -1 and pos2 != -1:
@@ -162,7 +820,7 @@ if __name__ == '__main__':
             config.FANCYhd = True  # assume MiKTeX can handle the 'fancyhdr' package
 
     # command line arguments...
-    validargs = ['-v', '-log', '-tex', '-old', 'a4', '-let', '-dpo']
+    validargs = ['-v', '-log', '-tex', '-old', 'a4', '-let', '-dpo', '-fmt']
     for i in list(range(1, len(sys.argv))):
         if sys.argv[i] not in validargs:
             print("Invalid argument: {}".format(sys.argv[i]))
@@ -174,6 +832,13 @@ if __name__ == '__main__':
             print(" -a4  ... A4 papersize")
             print(" -let ... Letter papersize")
             print(" -dpo ... data pages only")
+            print(" -fmt ... load each preamble from a precompiled TeX format (faster for short tables)")
+            print(" --jobs N ... generate the pages in N processes (0 = one per CPU core)")
+            print(" --split N ... compile a nautical almanac year in chunks of N double pages")
+            print(" --pipeline N ... compute nautical almanac pages N pages ahead while writing (in threads)")
+            print(" --warm-cache YEAR ... compute the ephemeris data of YEAR for the ephemeris store")
+            print(" --export FORMAT YEAR ... export the almanac data of YEAR (or YYYY-YYYY) as csv, jsonl or npz")
+            print(" --batch FILE ... create the products listed in a JSON or TOML manifest (no prompts)")
             sys.exit(0)
 
     # NOTE: pdfTeX 3.14159265-2.6-1.40.21 (TeX Live 2020/Debian), as used in the Docker
@@ -182,6 +847,7 @@ if __name__ == '__main__':
     keeplog = True if "-log" in set(sys.argv[1:]) else False
     keeptex = True if "-tex" in set(sys.argv[1:]) else False
     config.DPonly = True if "-dpo" in set(sys.argv[1:]) else False
+    config.texfmt = True if "-fmt" in set(sys.argv[1:]) else False
     if "-old" in set(sys.argv[1:]): config.FANCYhd = False  # don't use the 'fancyhdr' package
     forcepgsz = False
     if not("-a4" in set(sys.argv[1:]) and "-let" in set(sys.argv[1:])):
@@ -202,7 +868,6 @@ if __name__ == '__main__':
         docker_main = os.getcwd()
         spdf = docker_main + "/"            # path to pdf/png/jpg in the Docker Image
         config.pgsz = os.getenv('PGSZ', config.pgsz)
-        config.search_next_rising_sun = os.getenv('SNRS', str(config.search_next_rising_sun))
         stdt = os.getenv('SDATE', 'None')
         if stdt != 'None':      # for testing a specific date
             try:
@@ -212,30 +877,25 @@ if __name__ == '__main__':
                 sys.exit(0)
             d = first_day
         err1 = " the Docker .env file"
-        err2 = "for SNRS in the Docker .env file"
     else:
         spad = spdf = "./"   # path when executing the GitHub files in a folder
-        config.search_next_rising_sun = str(config.search_next_rising_sun)
         err1 = "config.py"
-        err2 = "for search_next_rising_sun in config.py"
 
     if config.pgsz not in set(['A4', 'Letter']):
         print("Please choose a valid paper size in {}".format(err1))
         sys.exit(0)
 
-    if config.search_next_rising_sun.lower() not in set(['true', 'false']):
-        print("Please choose a boolean value {}".format(err2))
-        sys.exit(0)
-
     # ------------ process user input ------------
 
-    global yrmin, yrmax
-    yrmin = 1000
-    yrmax = 3000
-    config.search_next_rising_sun = (config.search_next_rising_sun.lower() == 'true')   # to boolean
     f_prefix = config.docker_prefix
     f_postfix = config.docker_postfix
 
+    if batchfile is not None:       # create the products of a manifest and exit
+        start = time.time()
+        batch(readmanifest(batchfile), d, spdf, listarg, keeplog, keeptex, forcepgsz)
+        print("execution time = {:0.2f} seconds".format(time.time()-start))
+        sys.exit(0)
+
     s = input("""\nWhat do you want to create?:\n
     1   Nautical Almanac   (for a day/month/year)
     2   Sun tables only    (for a day/month/year)
@@ -371,18 +1031,24 @@ if __name__ == '__main__':
                 fn = toUnix("{}({})_{}".format(ff,papersize,year+DecFmt))
                 deletePDF(f_prefix + fn)
                 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
-                outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-                outfile.write(nautical.almanac(first_day,0))
-                outfile.close()
+                if config.split > 0:
+                    early = config.lookahead > 0 and not os.path.exists(f_prefix + fn + ".texhash")
+                    written = startchunk(listarg, keeplog) if early else None
+                    parts = splitTeX(nautical.almanac(first_day,0), datapreamble(nautical.almanac,first_day,0), fn, config.split, written)
+                else:
+                    outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
+                    writeTeX(outfile, nautical.almanac(first_day,0))
+                    outfile.close()
                 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
                 stop = time.time()
                 msg = "execution time = {:0.2f} seconds".format(stop-start)
                 print(msg)
                 print()
-                if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
-                makePDF(listarg, fn)
-                tidy_up(fn, keeplog, keeptex)
-                if config.dockerized: os.chdir(docker_main)     # reset working folder to code folder
+                if config.split > 0:
+                    startsplit(listarg, fn, parts, keeplog, keeptex, early)
+                else:
+                    startPDF(listarg, fn, keeplog, keeptex)    # compile while the next year is computed
+            waitPDF()
 
         if s == '1' and entireMth:        # Nautical Almanac (for a month)
             check_exists(spdf + "A4chartNorth_P.pdf")
@@ -394,7 +1060,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(nautical.almanac(first_day,-1))
+            writeTeX(outfile, nautical.almanac(first_day,-1))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             stop = time.time()
@@ -421,7 +1087,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(nautical.almanac(first_day,daystoprocess))
+            writeTeX(outfile, nautical.almanac(first_day,daystoprocess))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             stop = time.time()
@@ -445,13 +1111,11 @@ if __name__ == '__main__':
                 deletePDF(f_prefix + fn)
                 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
                 outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-                outfile.write(suntables.sunalmanac(first_day,0))
+                outfile.writelines(suntables.sunalmanac(first_day,0))
                 outfile.close()
                 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
-                if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
-                makePDF(listarg, fn)
-                tidy_up(fn, keeplog, keeptex)
-                if config.dockerized: os.chdir(docker_main)     # reset working folder to code folder
+                startPDF(listarg, fn, keeplog, keeptex)    # compile while the next year is computed
+            waitPDF()
 
         elif s == '2' and entireMth:      # Sun Tables (for a month)
             check_exists(spdf + "Ra.jpg")
@@ -462,7 +1126,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(suntables.sunalmanac(first_day,-1))
+            outfile.writelines(suntables.sunalmanac(first_day,-1))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
@@ -484,7 +1148,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(suntables.sunalmanac(first_day,daystoprocess))
+            outfile.writelines(suntables.sunalmanac(first_day,daystoprocess))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
@@ -505,17 +1169,15 @@ if __name__ == '__main__':
                 deletePDF(f_prefix + fn)
                 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
                 outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-                outfile.write(eventtables.makeEVtables(first_day,0))
+                outfile.writelines(eventtables.makeEVtables(first_day,0))
                 outfile.close()
                 # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
                 stop = time.time()
                 msg = "execution time = {:0.2f} seconds".format(stop-start)
                 print(msg)
                 print()
-                if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
-                makePDF(listarg, fn)
-                tidy_up(fn, keeplog, keeptex)
-                if config.dockerized: os.chdir(docker_main)     # reset working folder to code folder
+                startPDF(listarg, fn, keeplog, keeptex)    # compile while the next year is computed
+            waitPDF()
 
         elif s == '3' and entireMth:      # Event Time tables  (for a month)
             check_exists(spdf + "A4chartNorth_P.pdf")
@@ -526,7 +1188,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(eventtables.makeEVtables(first_day,-1))
+            outfile.writelines(eventtables.makeEVtables(first_day,-1))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             stop = time.time()
@@ -551,7 +1213,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(eventtables.makeEVtables(first_day,daystoprocess))
+            outfile.writelines(eventtables.makeEVtables(first_day,daystoprocess))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             stop = time.time()
@@ -575,7 +1237,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(nautical.almanac(first_day,6))
+            writeTeX(outfile, nautical.almanac(first_day,6))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
     ##        msg = 'Count of incorrect values: {}'.format(config.errors)
@@ -596,7 +1258,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(suntables.sunalmanac(first_day,30))
+            outfile.writelines(suntables.sunalmanac(first_day,30))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
@@ -613,7 +1275,7 @@ if __name__ == '__main__':
             deletePDF(f_prefix + fn)
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(eventtables.makeEVtables(first_day,6))
+            outfile.writelines(eventtables.makeEVtables(first_day,6))
             outfile.close()
             # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
             if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
@@ -624,15 +1286,19 @@ if __name__ == '__main__':
             msg = "\nCreating the Increments and Corrections tables\n"
             print(msg)
             fn = toUnix("Inc({})").format(papersize)
-            deletePDF(f_prefix + fn)
-            # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
-            outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
-            outfile.write(increments.makelatex())
-            outfile.close()
-            # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
-            if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
-            makePDF(listarg, fn)
-            tidy_up(fn, keeplog, keeptex)
+            cached = staticfile(fn)     # before the working folder changes (Docker)
+            if not getstatic(fn, keeptex, cached):
+                deletePDF(f_prefix + fn)
+                # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+                outfile = open(f_prefix + fn + ".tex", mode="w", encoding="utf8")
+                outfile.write(increments.makelatex())
+                outfile.close()
+                # :::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+                pdf = os.path.abspath(f_prefix + fn + ".pdf")
+                if config.dockerized: os.chdir(os.getcwd() + f_postfix)     # DOCKER ONLY
+                makePDF(listarg, fn)
+                tidy_up(fn, keeplog, keeptex)
+                putstatic(fn, pdf, cached)
 
     else:
         print("Error! Choose 1, 2, 3, 4, 5, 6 or 7")
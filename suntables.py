@@ -32,6 +32,8 @@ import ephem
 
 ###### Local application imports ######
 from alma_ephem import *
+from almadata import *
+from pagepool import pagemap
 import config
 
 #----------------------
@@ -106,7 +108,7 @@ def NSdecl(deg, hr, printNS, printDEG, modernFMT):
     if not(printDEG):
         deg = deg[10:]	# skip the degrees (always dd°mm.m) - note: the degree symbol '$^\circ$' is eight bytes long
         if (hr+3)%6 == 0:
-            deg = r'''\raisebox{0.24ex}{\boldmath$\cdot$~\boldmath$\cdot$~~}''' + deg
+            deg = r'''\DDOTS''' + deg
     if modernFMT:
         if printNS or hr%6 == 0:
             sdeg = r'''\textcolor{{blue}}{{{}}}'''.format(hemisph) + deg
@@ -120,22 +122,55 @@ def NSdecl(deg, hr, printNS, printDEG, modernFMT):
     #print("sdeg: ", sdeg)
     return sdeg
 
-# >>>>>>>>>>>>>>>>>>>>>>>>
-def suntab(date, n):
-    # generates LaTeX table for sun only (traditional)
+def sunhour(sun, i):
+    # returns the sun's GHA and Dec (formatted) plus Dec in radians for grid hour 'i'
+    return nadeg(sun['gha'][i]), nadeg(sun['dec'][i],2), sun['dec'][i]
+
+def texmacros():
+    # returns the preamble macros for the table fragments that are repeated on every page:
+    #   \SThead{day}    the daily column headings of suntab(m)
+    #   \GS             row terminator with a gap after every sixth hour
+    #   \RC             shaded row (modern style)
+    #   \DDOTS          dots for an omitted degree of declination
+    # note: the heading macros begin (or end) a table row, where spaces are ignored
+
+    tex = r'''
+\newcommand{\DDOTS}{\raisebox{0.24ex}{\boldmath$\cdot$~\boldmath$\cdot$~~}}
+\newcommand{\GS}{\\[2Pt]}'''
+    if config.tbls == "m":
+        tex += r'''
+\newcommand{\SThead}[1]{\multicolumn{1}{c}{\footnotesize{\textbf{#1}}} & \multicolumn{1}{c}{\footnotesize{\textbf{GHA}}} & \multicolumn{1}{c}{\footnotesize{\textbf{Dec}}}\\
+\cmidrule{1-3}}
+\newcommand{\RC}{\rowcolor{LightCyan}}'''
+    else:
+        tex += r'''
+\newcommand{\SThead}[1]{\hline
+\multicolumn{1}{|c|}{\rule{0pt}{2.6ex}\textbf{#1}} & \multicolumn{1}{c}{\textbf{GHA}} & \multicolumn{1}{c|}{\textbf{Dec}}\\
+\hline}'''
+    return tex
+
+def sundata(date, n):
+    # returns the hourly data of the Sun for 'n' days beginning at 'date'
 
     first_day = r'''{}/{}/{}'''.format(date.year,date.month,date.day)
     dfl = ephem.Date(first_day)    # convert date to float
+    return almanacdata(dfl, n, False, ['sun'], False)
+
+# >>>>>>>>>>>>>>>>>>>>>>>>
+def suntab(data):
+    # generates LaTeX table for sun only (traditional)
+
+    dfl = data.date
+    n = data.days
 
     tab = r'''\noindent
 \begin{tabular*}{0.2\textwidth}[t]{@{\extracolsep{\fill}}|c|rr|}
 '''
+    sun = data.grid['sun']
+    i0 = 0          # grid index of hour 0 of the current day
     while n > 0:
-        dhr = dfl       # variable to increment per hour
         # print date based on dfl (as Ephem routines use dfl)
-        tab = tab + r'''\hline
-\multicolumn{{1}}{{|c|}}{{\rule{{0pt}}{{2.6ex}}\textbf{{{}}}}} & \multicolumn{{1}}{{c}}{{\textbf{{GHA}}}} & \multicolumn{{1}}{{c|}}{{\textbf{{Dec}}}}\\
-\hline\rule{{0pt}}{{2.6ex}}\noindent
+        tab = tab + r'''\SThead{{{}}}\rule{{0pt}}{{2.6ex}}\noindent
 '''.format(ephem.date(dfl).datetime().strftime("%d"))
         h = 0
 
@@ -143,8 +178,7 @@ def suntab(date, n):
             # first populate an array of 24 hours with all data
             hourlydata = [[] for i in range(24)]
             while h < 24:
-                hourlydata[h] = sunmoon(dhr)
-                dhr += ephem.hour
+                hourlydata[h] = sunhour(sun, i0+h)
                 h += 1
             # now print the data per hour
             h = 0
@@ -161,32 +195,31 @@ def suntab(date, n):
                     nexteph = hourlydata[23]	# hour 24 = hour 23
 
                 # format declination checking for hemisphere change
-                printNS, printDEG = declCompare(preveph[7],eph[7],nexteph[7],h)
+                printNS, printDEG = declCompare(preveph[2],eph[2],nexteph[2],h)
                 sdec = NSdecl(eph[1],h,printNS,printDEG,False)
 
                 line = "{} & {} & {}".format(h,eph[0],sdec)
                 lineterminator = r'''\\
 '''
                 if h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab += line + lineterminator
                 h += 1
 
         else:			# Positive/Negative Declinations
             while h < 24:
-                eph = sunmoon(dhr)
+                eph = sunhour(sun, i0+h)
                 line = "{} & {} & {}".format(h,eph[0],eph[1])
                 lineterminator = r'''\\
 '''
                 if h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab += line + lineterminator
                 h += 1
-                dhr += ephem.hour
 
-        vd = sun_moon_SD(dfl)
+        vd = ("{:0.1f}".format(sun['d'][i0]), "{:0.1f}".format(sun['sd'][i0]))
         tab = tab + r'''\hline
 \rule{{0pt}}{{2.4ex}} & 
 \multicolumn{{1}}{{c}}{{SD={}$'$}} & 
@@ -198,16 +231,17 @@ def suntab(date, n):
             tab = tab + r'''\multicolumn{1}{c}{}\\[-0.5ex]'''
         n -= 1
         dfl += 1
+        i0 += 24
 
     tab = tab + r'''\end{tabular*}'''
     return tab
 
 # >>>>>>>>>>>>>>>>>>>>>>>>
-def suntabm(date, n):
+def suntabm(data):
     # generates LaTeX table for sun only (modern)
 
-    first_day = r'''{}/{}/{}'''.format(date.year,date.month,date.day)
-    dfl = ephem.Date(first_day)    # convert date to float
+    dfl = data.date
+    n = data.days
 
     if config.decf != '+':	# USNO format for Declination
         colsep = "4pt"
@@ -219,12 +253,12 @@ def suntabm(date, n):
 \setlength{{\tabcolsep}}{{{}}}
 \begin{{tabular}}[t]{{crr}}'''.format(colsep)
 
+    sun = data.grid['sun']
+    i0 = 0          # grid index of hour 0 of the current day
     while n > 0:
-        dhr = dfl       # variable to increment per hour
         # print date based on dfl (as Ephem routines use dfl)
         tab = tab + r'''
-\multicolumn{{1}}{{c}}{{\footnotesize{{\textbf{{{}}}}}}} & \multicolumn{{1}}{{c}}{{\footnotesize{{\textbf{{GHA}}}}}} & \multicolumn{{1}}{{c}}{{\footnotesize{{\textbf{{Dec}}}}}}\\
-\cmidrule{{1-3}}
+\SThead{{{}}}
 '''.format(ephem.date(dfl).datetime().strftime("%d"))
         h = 0
 
@@ -232,8 +266,7 @@ def suntabm(date, n):
             # first populate an array of 24 hours with all data
             hourlydata = [[] for i in range(24)]
             while h < 24:
-                hourlydata[h] = sunmoon(dhr)
-                dhr += ephem.hour
+                hourlydata[h] = sunhour(sun, i0+h)
                 h += 1
             # now print the data per hour
             h = 0
@@ -252,17 +285,17 @@ def suntabm(date, n):
                     nexteph = hourlydata[23]	# hour 24 = hour 23
 
                 # format declination checking for hemisphere change
-                printNS, printDEG = declCompare(preveph[7],eph[7],nexteph[7],h)
+                printNS, printDEG = declCompare(preveph[2],eph[2],nexteph[2],h)
                 sdec = NSdecl(eph[1],h,printNS,printDEG,True)
 
                 line = r'''\color{{blue}}{{{}}} & '''.format(h)
                 line = line + "{} & {}".format(eph[0],sdec)
                 if group == 1:
-                    tab = tab + r'''\rowcolor{LightCyan}'''
+                    tab = tab + r'''\RC'''
                 lineterminator = r'''\\
 '''
                 if config.pgsz == "A4" and h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab += line + lineterminator
                 h += 1
@@ -271,21 +304,20 @@ def suntabm(date, n):
             while h < 24:
                 band = int(h/6)
                 group = band % 2
-                eph = sunmoon(dhr)
+                eph = sunhour(sun, i0+h)
                 line = r'''\color{{blue}}{{{}}} & '''.format(h)
                 line = line + "{} & {}".format(eph[0],eph[1])
                 if group == 1:
-                    tab = tab + r'''\rowcolor{LightCyan}'''
+                    tab = tab + r'''\RC'''
                 lineterminator = r'''\\
 '''
                 if config.pgsz == "A4" and h < 23 and (h+1)%6 == 0:
-                    lineterminator = r'''\\[2Pt]
+                    lineterminator = r'''\GS
 '''
                 tab += line + lineterminator
                 h += 1
-                dhr += ephem.hour
 
-        vd = sun_moon_SD(dfl)
+        vd = ("{:0.1f}".format(sun['d'][i0]), "{:0.1f}".format(sun['sd'][i0]))
         tab = tab + r'''\cmidrule{{2-3}} & 
 \multicolumn{{1}}{{c}}{{\scriptsize{{SD\,=\,{}$'$}}}} & \multicolumn{{1}}{{c}}{{\footnotesize{{\textit{{d}}\,=\,{}$'$}}}}\\
 \cmidrule{{2-3}}'''.format(vd[1],vd[0])
@@ -295,6 +327,7 @@ def suntabm(date, n):
 \multicolumn{3}{c}{}\\[-1.5ex]'''
         n -= 1
         dfl += 1
+        i0 += 24
 
     tab = tab + r'''
 \end{tabular}'''
@@ -334,14 +367,14 @@ def page(date, dpp=15):
 
     if config.tbls == "m":
         while dpp > 0:
-            page += suntabm(date,min(3,dpp))
+            page += suntabm(sundata(date,min(3,dpp)))
             date += timedelta(days=3)
             dpp -= 3
             if dpp > 0: page = page + r'''\quad
 '''
     else:
         while dpp > 0:
-            page += suntab(date,min(3,dpp))
+            page += suntab(sundata(date,min(3,dpp)))
             date += timedelta(days=3)
             dpp -= 3
 
@@ -355,7 +388,7 @@ def page(date, dpp=15):
 def pages(first_day, dtp):
     # dtp = 0 if for entire year; = -1 if for entire month; else days to print
 
-    out = ''
+    args = []       # page arguments in date order
 
     if dtp == 0:       # if entire year
         year = first_day.year
@@ -366,8 +399,8 @@ def pages(first_day, dtp):
             day15 = day1 + timedelta(days=14)
             if day15.year != yr:
                 dpp -= day15.day
-                if dpp <= 0: return out
-            out += page(day1, dpp)
+                if dpp <= 0: break
+            args.append((day1, dpp))
             day1 += timedelta(days=15)
             year = day1.year
     elif dtp == -1:    # if entire month
@@ -379,8 +412,8 @@ def pages(first_day, dtp):
             day15 = day1 + timedelta(days=14)
             if day15.month != m:
                 dpp -= day15.day
-                if dpp <= 0: return out
-            out += page(day1, dpp)
+                if dpp <= 0: break
+            args.append((day1, dpp))
             day1 += timedelta(days=15)
             mth = day1.month
     else:               # print 'dtp' days beginning with first_day
@@ -388,11 +421,11 @@ def pages(first_day, dtp):
         dpp = 15      # 15 days per page maximum
         while dtp > 0:
             if dtp <= 15: dpp = dtp
-            out += page(day1, dpp)
+            args.append((day1, dpp))
             dtp -= 15
             day1 += timedelta(days=15)
 
-    return out
+    return pagemap(page, args)
 
 def page2():
     return r'''
@@ -432,6 +465,7 @@ def page2():
 
 def sunalmanac(first_day, dtp):
     # make almanac starting from first_day
+    # returns a generator of LaTeX fragments (the preamble, then page by page)
 
     if config.FANCYhd:
         return makeSUNnew(first_day, dtp) # use the 'fancyhdr' package
@@ -624,7 +658,9 @@ def makeSUNnew(first_day, dtp):
 \usepackage[pdftex]{graphicx}
 %\showboxbreadth=50  % use for logging
 %\showboxdepth=50    % use for logging
-%\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}
+%\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}'''
+    tex += texmacros()
+    tex += r'''
 \begin{document}'''
 
     if not config.DPonly:
@@ -634,10 +670,10 @@ def makeSUNnew(first_day, dtp):
 \pagestyle{datapage}  % the default page style for the document
 \setcounter{page}{1}    % otherwise it's 2'''
 
-    tex += pages(first_day,dtp)
-    tex += r'''
+    yield tex
+    yield from pages(first_day,dtp)
+    yield r'''
 \end{document}'''
-    return tex
 
 # ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===   ===
 # ===   ===   ===   ===   O L D   F O R M A T T I N G   ===   ===   ===   ===
@@ -787,13 +823,15 @@ def makeSUNold(first_day, dtp):
 \usepackage[pdftex]{graphicx}
 %\showboxbreadth=50  % use for logging
 %\showboxdepth=50    % use for logging
-%\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}
+%\DeclareUnicodeCharacter{00B0}{\ensuremath{{}^\circ}}'''
+    tex += texmacros()
+    tex += r'''
 \begin{document}'''
 
     if not config.DPonly:
         tex += hdrSUNold(first_day,dtp)
 
-    tex += pages(first_day,dtp)
-    tex += r'''
-\end{document}'''
-    return tex
\ No newline at end of file
+    yield tex
+    yield from pages(first_day,dtp)
+    yield r'''
+\end{document}'''
\ No newline at end of file
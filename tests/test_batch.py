@@ -0,0 +1,45 @@
+# Plans the products of batch manifests (see 'batch mode' in pyalmanac.py).
+
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import pyalmanac
+
+spdf = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/"
+today = date(2024, 3, 15)
+
+
+def products(groups):
+    return [[(unit[0], unit[3]) for unit in group] for group in groups]
+
+
+def test_overlapping_dates_are_grouped(monkeypatch):
+    monkeypatch.setattr(config, 'pgsz', 'A4')
+    manifest = {"jobs": [{"product": "NA", "dates": "2024-2025", "style": "t"},
+                         {"product": "EV", "dates": "2024"},
+                         {"product": "ST", "dates": "01062024", "days": 30, "style": "m+"},
+                         {"product": "NA", "dates": "2024"},     # listed twice
+                         {"product": "INC"}]}
+    groups = pyalmanac.planbatch(manifest, today, spdf)
+    na24 = pyalmanac.toUnix("NAtrad(A4)_2024")
+    assert products(groups) == [
+        [("INC", pyalmanac.toUnix("Inc(A4)"))],
+        [("NA", na24), ("EV", pyalmanac.toUnix("Event-Times(A4)_2024")),
+         ("ST", pyalmanac.toUnix("STmod(A4)_20240601-20240630[old]"))],
+        [("NA", pyalmanac.toUnix("NAtrad(A4)_2025"))]]
+
+
+def test_paper_size_from_manifest_or_command_line(monkeypatch):
+    monkeypatch.setattr(config, 'pgsz', 'A4')
+    manifest = {"paper": "Letter",
+                "jobs": [{"product": "EV", "dates": "03"},
+                         {"product": "NA", "dates": "15032024", "days": 6, "paper": "A4"}]}
+    units = [u for g in pyalmanac.planbatch(manifest, today, spdf) for u in g]
+    assert sorted(u[6] for u in units) == ['A4', 'Letter']
+    units = [u for g in pyalmanac.planbatch(manifest, today, spdf, forcepgsz=True) for u in g]
+    assert [u[6] for u in units] == ['A4', 'A4']
+    # the month and the 6 days overlap
+    assert len(pyalmanac.planbatch(manifest, today, spdf, forcepgsz=True)) == 1
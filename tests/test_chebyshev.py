@@ -0,0 +1,32 @@
+# Compares the hourly grid evaluated from Chebyshev fits (config.chebyshev)
+# with the direct PyEphem computation for every page of a year.
+
+import os
+import sys
+from math import pi
+
+import ephem
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import alma_ephem
+
+
+def test_chebyshev_matches_direct_for_a_year(monkeypatch):
+    monkeypatch.setattr(config, 'ephemstore', False)
+    first = ephem.date('2024/1/1')
+    worst = {name: 0.0 for name in alma_ephem.gridbodies}
+    for day in range(0, 366, 3):        # the nautical almanac pages (3 days each)
+        monkeypatch.setattr(config, 'chebyshev', True)
+        fitted = alma_ephem.hourgrid(ephem.date(first + day), 72)
+        monkeypatch.setattr(config, 'chebyshev', False)
+        direct = alma_ephem.hourgrid(ephem.date(first + day), 72)
+        for name in alma_ephem.gridbodies:
+            dgha = np.mod(fitted[name]['gha'] - direct[name]['gha'] + pi, 2*pi) - pi
+            ddec = fitted[name]['dec'] - direct[name]['dec']
+            err = max(np.abs(dgha).max(), np.abs(ddec).max())*180*60/pi
+            worst[name] = max(worst[name], err)
+        alma_ephem.statecache.clear()
+    for name, err in worst.items():
+        assert err <= alma_ephem.chebbound, "{}: {:0.4f}'".format(name, err)
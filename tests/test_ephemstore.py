@@ -0,0 +1,83 @@
+# Saves computed ephemerides in the ephemeris store, loads them again and
+# compares them with the direct computation.
+
+import os
+import sys
+
+import ephem
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import alma_ephem
+
+
+def test_store_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'docker_prefix', "")
+    monkeypatch.setattr(config, 'storedir', str(tmp_path))
+    monkeypatch.setattr(config, 'ephemstore', False)
+    monkeypatch.setattr(alma_ephem, 'cachesize', float('inf'))
+    monkeypatch.setattr(alma_ephem, 'risesize', float('inf'))
+    alma_ephem.statecache.clear()
+    alma_ephem.risecache.clear()
+    alma_ephem.storeyears.clear()
+
+    dates = [ephem.date('2024/3/1') + h*ephem.hour for h in range(48)]
+    names = ['sun', 'moon', 'venus', 'Sirius']
+    states = {(name, d): alma_ephem.bodystate(name, d) for name in names for d in dates}
+    aries = {d: alma_ephem.sidereal(d) for d in dates}
+    rises = {(lat, rising): alma_ephem.riseset('moon', lat, dates[0], '-0:34', rising)
+             for lat in [72, 50, 0, -60] for rising in [True, False]}
+    alma_ephem.savestore(2024)
+
+    alma_ephem.statecache.clear()
+    alma_ephem.risecache.clear()
+    monkeypatch.setattr(config, 'ephemstore', True)
+    store = alma_ephem.loadstore(2024)
+    dates_mm, rows_mm = store['bodies']
+    assert isinstance(dates_mm, np.memmap) and isinstance(rows_mm, np.memmap)
+
+    for (name, d), st in states.items():
+        assert alma_ephem.stored((name, float(d)), d) == st
+        assert alma_ephem.bodystate(name, d) == st
+    for d, st in aries.items():
+        assert alma_ephem.stored(('aries', float(d)), d) == st
+    for (lat, rising), res in rises.items():
+        alma_ephem.risecache.clear()
+        assert alma_ephem.riseset('moon', lat, dates[0], '-0:34', rising) == res
+    assert alma_ephem.stored(('jupiter', float(dates[0])), dates[0]) is None
+
+    alma_ephem.statecache.clear()
+    alma_ephem.risecache.clear()
+    alma_ephem.storeyears.clear()
+
+
+def test_stored_results_are_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'docker_prefix', "")
+    monkeypatch.setattr(config, 'storedir', str(tmp_path))
+    monkeypatch.setattr(config, 'ephemstore', False)
+    alma_ephem.statecache.clear()
+    alma_ephem.risecache.clear()
+    alma_ephem.storeyears.clear()
+
+    d = ephem.date('2024/3/1')
+    st = alma_ephem.bodystate('moon', d)
+    aries = alma_ephem.sidereal(d)
+    res = alma_ephem.riseset('sun', 50, d, '-0:34', True)
+    alma_ephem.savestore(2024)
+
+    alma_ephem.statecache.clear()
+    alma_ephem.risecache.clear()
+    monkeypatch.setattr(config, 'ephemstore', True)
+    lookups = []
+    lookup = alma_ephem.lookup
+    monkeypatch.setattr(alma_ephem, 'lookup', lambda store, key: lookups.append(key) or lookup(store, key))
+    for i in range(3):
+        assert alma_ephem.bodystate('moon', d) == st
+        assert alma_ephem.sidereal(d) == aries
+        assert alma_ephem.riseset('sun', 50, d, '-0:34', True) == res
+    assert len(lookups) == 3        # found in the store once, then in the cache
+
+    alma_ephem.statecache.clear()
+    alma_ephem.risecache.clear()
+    alma_ephem.storeyears.clear()
@@ -0,0 +1,42 @@
+# Compares the replicated rise/set search (see 'rise/set searches' in alma_ephem.py)
+# with PyEphem's Observer.next_rising(), next_setting(), previous_rising() and
+# previous_setting(), including days without an event near the poles.
+
+import os
+import sys
+
+import ephem
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import alma_ephem
+
+pytestmark = pytest.mark.skipif(not alma_ephem.riset_replica,
+    reason="no replicated search for PyEphem {}".format(ephem.__version__))
+
+lats = [-88, -72, -66, -60, -30, 0, 30, 60, 62, 64, 66, 68, 70, 72, 88]
+horizons = {'sun': ['-0:34', ephem.degrees('-6'), ephem.degrees('-12')], 'moon': ['-0:34']}
+
+
+def search(monkeypatch, replica, name, lat, start, horizon, rising, direction):
+    monkeypatch.setattr(alma_ephem, 'riset_replica', replica)
+    return alma_ephem.risesearch(name, ephem.degrees('{}:00:00.0'.format(lat)),
+                                 start, ephem.degrees(horizon), rising, direction)
+
+
+def test_replica_matches_pyephem(monkeypatch):
+    states = set()
+    for day in range(0, 366, 7):
+        # from 30 seconds (nautical almanac) or 0.5 seconds (event tables) before midnight
+        for start in [ephem.date('2024/1/1') + day - 30 * ephem.second,
+                      ephem.date('2024/1/4') + day - 0.5 * ephem.second]:
+            for name in ['sun', 'moon']:
+                for lat in lats:
+                    for horizon in horizons[name]:
+                        for rising in [True, False]:
+                            for direction in [1, -1]:
+                                args = (name, lat, start, horizon, rising, direction)
+                                res = search(monkeypatch, True, *args)
+                                assert res == search(monkeypatch, False, *args), args
+                                states.add(res.state)
+    assert states == {-1, 0, 1}     # events and circumpolar days are compared
@@ -0,0 +1,62 @@
+# Splits the TeX fragments of a nautical almanac into chunk documents
+# (see 'split-and-merge of a year' in pyalmanac.py).
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import pyalmanac
+
+head = "\\documentclass{report}\n\\setcounter{page}{2}\n\\begin{document}\nTITLE"
+dppreamble = "\\documentclass{report}\n\\setcounter{page}{2}\n\\begin{document}"
+end = "\n\\end{document}"
+
+
+@pytest.fixture
+def prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'docker_prefix', str(tmp_path) + "/")
+    return str(tmp_path) + "/"
+
+
+def split(pages, size, prefix):
+    fragments = [head] + ["\nPAGE{}".format(i) for i in range(pages)] + [end]
+    written = []
+    parts = pyalmanac.splitTeX(fragments, dppreamble, "NA(A4)_2024", size, written.append)
+    assert written == parts
+    texts = []
+    for part in parts:
+        with open(prefix + part + ".tex", encoding="utf8") as f:
+            texts.append(f.read())
+    return parts, texts
+
+
+def test_no_fragments(prefix):
+    assert pyalmanac.splitTeX(iter([]), dppreamble, "NA", 2) == []
+
+
+def test_no_data_pages(prefix):
+    parts, texts = split(0, 2, prefix)
+    assert parts == ["NA-A4-_2024-part1"]
+    assert texts == [head + end]
+
+
+def test_single_page(prefix):
+    parts, texts = split(1, 2, prefix)
+    assert texts == [head + "\nPAGE0" + end]
+
+
+def test_pages_divisible_by_size(prefix):
+    parts, texts = split(6, 3, prefix)
+    assert len(parts) == 2
+    assert texts[0] == head + "\nPAGE0\nPAGE1\nPAGE2" + end
+    # the second chunk continues the page numbering (3 double pages later)
+    assert texts[1] == dppreamble.replace("{page}{2}", "{page}{8}") + "\nPAGE3\nPAGE4\nPAGE5" + end
+
+
+def test_pages_not_divisible_by_size(prefix):
+    parts, texts = split(7, 3, prefix)
+    assert len(parts) == 3
+    assert texts[2] == dppreamble.replace("{page}{2}", "{page}{14}") + "\nPAGE6" + end
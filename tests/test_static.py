@@ -0,0 +1,40 @@
+# Keeps a static product in the cache of static products and copies it back,
+# as option 7 does in a Docker container (which changes into 'docker_pdf' to run
+# pdflatex).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import pyalmanac
+
+
+def test_put_get_with_changed_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'staticcache', True)
+    monkeypatch.setattr(config, 'docker_prefix', "tmp/")
+    monkeypatch.setattr(config, 'cachedir', "cache")
+    monkeypatch.setattr(config, 'texversion', "TeX 3.141592653")
+    monkeypatch.chdir(tmp_path)         # the code folder
+    os.mkdir("tmp")
+    fn = pyalmanac.toUnix("Inc(A4)")
+    cached = pyalmanac.staticfile(fn)
+    assert cached == os.path.join(str(tmp_path), "tmp", "cache", os.path.basename(cached))
+    assert not pyalmanac.getstatic(fn, False, cached)
+
+    pdf = os.path.abspath("tmp/" + fn + ".pdf")
+    monkeypatch.chdir(tmp_path / "tmp")
+    with open(pdf, mode="wb") as f:
+        f.write(b"%PDF-1.5 increments")
+    pyalmanac.putstatic(fn, pdf, cached)
+    monkeypatch.chdir(tmp_path)
+
+    os.remove(pdf)
+    assert pyalmanac.getstatic(fn, False, pyalmanac.staticfile(fn))
+    with open(pdf, mode="rb") as f:
+        assert f.read() == b"%PDF-1.5 increments"
+    # the TeX is to be kept: create it again
+    assert not pyalmanac.getstatic(fn, True, cached)
+    # another paper size is another product
+    monkeypatch.setattr(config, 'pgsz', 'Letter' if config.pgsz == 'A4' else 'A4')
+    assert pyalmanac.staticfile(fn) != cached